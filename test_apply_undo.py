@@ -0,0 +1,56 @@
+import unittest
+
+from tetrisFinal import Board, TetrisAI, UndoRecord, apply_Move
+
+# Board.apply_Placement has to leave the board exactly as a real drop does, and Board.undo has to put it back
+# exactly, for every placement of every piece along seeded AI games, on boards of a few sizes
+# Run with python -m unittest test_apply_undo (or pytest)
+class ApplyUndoTest(unittest.TestCase):
+    SIZES = [(10, 22), (12, 16), (20, 40)]
+    NUM_GAMES = 2
+    MAX_PIECES = 150
+
+    def get_State(self, board):
+        return (list(board.rows), list(board.heights), list(board.column_Holes), board.holes, board.bumpiness,
+                board.hash, board.score, board.level, board.lines_Cleared)
+
+    def test_Every_Placement(self):
+        placements = cleared = 0
+        for num_Columns, num_Rows in self.SIZES:
+            for seed in range(self.NUM_GAMES):
+                board = Board(num_Columns, num_Rows, seed)
+                ai = TetrisAI(board)
+                record = UndoRecord(num_Columns)
+                for piece in range(self.MAX_PIECES):
+                    tetrimino = board.current_Tetrimino
+                    before = self.get_State(board)
+                    for rotation in range(4):
+                        tetrimino.set_Rotation(rotation)
+                        for x in range(-3, num_Columns + 3):
+                            tetrimino.x, tetrimino.y = x, 0
+                            if not board.is_Valid_Move(tetrimino, 0, 0):
+                                continue
+
+                            # The same drop on a copy, through the grid and clear_Lines
+                            dropped = board.copy()
+                            dropped.current_Tetrimino.set_Rotation(rotation)
+                            dropped.current_Tetrimino.x, dropped.current_Tetrimino.y = x, 0
+                            expected_Lines = dropped.drop_Piece(dropped.current_Tetrimino)
+
+                            lines_Cleared = board.drop_Placement(tetrimino, record)
+                            self.assertEqual(lines_Cleared, expected_Lines)
+                            self.assertEqual(self.get_State(board), self.get_State(dropped), (num_Columns, seed, piece, rotation, x))
+                            board.undo(record)
+                            self.assertEqual(self.get_State(board), before, (num_Columns, seed, piece, rotation, x))
+                            placements += 1
+                            cleared += lines_Cleared > 0
+
+                    tetrimino.set_Rotation(0)
+                    tetrimino.x, tetrimino.y = num_Columns // 2, 0
+                    best_Move = ai.get_Best_Move()
+                    if best_Move is None or not apply_Move(board, best_Move):
+                        break
+        self.assertGreater(cleared, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,14 @@
+import unittest
+
+from tetrisFinal import check_Batched_Parity, np
+
+# The batched NumPy evaluator has to pick the same move as the loop AI for every piece, ties included
+# Run with python -m unittest test_batched_parity (or pytest), the games are seeded so a failure can be replayed
+# with python tetrisFinal.py parity --seed N
+@unittest.skipIf(np is None, "NumPy is required for the batched AI")
+class BatchedParityTest(unittest.TestCase):
+    def test_Seeded_Games_Match(self):
+        self.assertEqual(check_Batched_Parity(num_Runs=4, max_Pieces=200, seed=0), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from tetrisEnv import TetrisVecEnv
+from tetrisFinal import SHAPE_ROTATIONS, TetrisAI, np, play_Headless_Game
+
+# Driving the environment with the greedy AI has to play the same games as the headless mode on the same seeds,
+# and the boards it steps have to stay complete boards the AI, snapshots and the window can read
+# Run with python -m unittest test_env (or pytest)
+@unittest.skipIf(np is None, "NumPy is required for the vectorized environment")
+class TetrisVecEnvTest(unittest.TestCase):
+    NUM_ENVS = 3
+    NUM_PIECES = 150
+    SEED = 5
+
+    def test_AI_Games_Match_Headless(self):
+        env = TetrisVecEnv(self.NUM_ENVS, seed=self.SEED)
+        observations = env.reset()
+        for _ in range(self.NUM_PIECES):
+            actions = []
+            for board in env.boards:
+                rotation, x = TetrisAI(board).get_Best_Move()
+                actions.append((rotation, x + SHAPE_ROTATIONS[board.current_Tetrimino.kind][rotation].min_x))
+            observations, rewards, dones = env.step(actions)
+            self.assertFalse(dones.any())
+
+        for i, board in enumerate(env.boards):
+            score, level, lines_Cleared, pieces = play_Headless_Game(seed=self.SEED + i, max_Pieces=self.NUM_PIECES)
+            self.assertEqual((board.score, board.level, board.lines_Cleared), (score, level, lines_Cleared))
+
+            # The incremental features, hash and grid match the bitboard
+            recounted = board.copy()
+            recounted.recount_Columns()
+            recounted.rehash()
+            self.assertEqual((board.heights, board.column_Holes, board.holes, board.bumpiness, board.hash),
+                             (recounted.heights, recounted.column_Holes, recounted.holes, recounted.bumpiness, recounted.hash))
+            for y, bits in enumerate(board.rows):
+                self.assertEqual([1 if value else 0 for value in board.grid[y]], [bits >> x & 1 for x in range(board.num_Columns)])
+                self.assertEqual(observations["grid"][i, y].tolist(), [bits >> x & 1 for x in range(board.num_Columns)])
+            self.assertEqual(observations["heights"][i].tolist(), board.heights)
+            self.assertEqual(observations["holes"][i], board.holes)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import random
+import unittest
+
+from tetrisFinal import CANONICAL_ROTATIONS, SHAPES, Board
+
+# Board.get_Reachable_Placements only searches the states next to the surface, so it is checked against a plain
+# breadth first search from the spawn position that moves, soft drops and rotates the way the game does,
+# with adjust_For_Rotation's kicks, on random boards with holes and overhangs
+# Run with python -m unittest test_reachable (or pytest)
+class ReachablePlacementsTest(unittest.TestCase):
+    NUM_BOARDS = 300
+    SIZES = [(10, 22), (12, 16), (8, 10)]
+
+    # Every distinct final placement found from the spawn position, (rotation, x, y) in the distinct rotation
+    def search_From_Spawn(self, board, kind):
+        tetrimino = board.new_Tetrimino(kind)
+        if not board.is_Valid_Move(tetrimino, 0, 0):
+            return []
+        seen = {(tetrimino.x, tetrimino.y, tetrimino.rotation)}
+        queue = list(seen)
+        placements = set()
+        for x, y, rotation in queue:
+            states = [(x - 1, y, rotation), (x + 1, y, rotation), (x, y + 1, rotation)]
+            for turn in (1, -1):
+                tetrimino.set_Rotation(rotation + turn)
+                tetrimino.x, tetrimino.y = x, y
+                if board.adjust_For_Rotation(tetrimino):
+                    states.append((tetrimino.x, tetrimino.y, tetrimino.rotation))
+            for new_x, new_y, new_Rotation in states:
+                tetrimino.set_Rotation(new_Rotation)
+                tetrimino.x, tetrimino.y = new_x, new_y
+                if (new_x, new_y, new_Rotation) not in seen and board.is_Valid_Move(tetrimino, 0, 0):
+                    seen.add((new_x, new_y, new_Rotation))
+                    queue.append((new_x, new_y, new_Rotation))
+
+            tetrimino.set_Rotation(rotation)
+            tetrimino.x, tetrimino.y = x, y
+            if not board.is_Valid_Move(tetrimino, 0, 1):
+                index, dx, dy = CANONICAL_ROTATIONS[kind][rotation]
+                placements.add((index, x + dx, y + dy))
+        return sorted(placements)
+
+    # A ragged stack of random height with random holes, overhangs and the odd wide gap under a ledge
+    def get_Random_Board(self, choice, num_Columns, num_Rows):
+        board = Board(num_Columns, num_Rows, choice.randrange(1000))
+        stack_Height = choice.randrange(num_Rows // 3, num_Rows - 1)
+        for y in range(num_Rows - stack_Height, num_Rows):
+            bits = 0
+            for x in range(num_Columns):
+                if choice.random() < 0.6:
+                    bits |= 1 << x
+            board.rows[y] = bits if bits != board.full_Row else bits & ~(1 << choice.randrange(num_Columns))
+        board.recount_Columns()
+        board.rehash()
+        return board
+
+    def test_Matches_Search_From_Spawn(self):
+        choice = random.Random(0)
+        searches = 0
+        for i in range(self.NUM_BOARDS):
+            num_Columns, num_Rows = self.SIZES[i % len(self.SIZES)]
+            board = self.get_Random_Board(choice, num_Columns, num_Rows)
+            for kind in range(len(SHAPES)):
+                self.assertEqual(board.get_Reachable_Placements(kind), self.search_From_Spawn(board, kind), (i, kind))
+                searches += 1
+        self.assertEqual(searches, self.NUM_BOARDS * len(SHAPES))
+
+if __name__ == "__main__":
+    unittest.main()
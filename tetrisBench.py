@@ -0,0 +1,274 @@
+import argparse
+import copy
+import gc
+import json
+import platform
+import random
+import sys
+import time
+
+from tetrisFinal import (Board, DEFAULT_WEIGHTS, TetrisAI, TranspositionCache,
+                         apply_Move, np, play_Headless_Game)
+
+# Benchmarks for the engine and AI hot paths
+# Microbenchmarks time single calls on a fixed corpus of board states taken from seeded AI games, macrobenchmarks
+# play whole seeded headless games. Results are written as JSON and can be compared against a saved baseline
+
+CORPUS_SEEDS = [1, 2, 3]
+CORPUS_STEP = 5     # Keep every 5th position of each corpus game
+SCALING_SIZES = [(10, 22), (20, 40), (100, 200)]    # Board sizes (columns, rows) of the scaling benchmark
+
+# Plays seeded AI games and keeps (board, move) pairs, the board just before the AI placed the move
+def build_Corpus(seeds=CORPUS_SEEDS, step=CORPUS_STEP, max_Pieces=400):
+    corpus = []
+    for seed in seeds:
+        board = Board(seed=seed)
+        ai = TetrisAI(board)
+        for piece in range(max_Pieces):
+            best_Move = ai.get_Best_Move()
+            if best_Move is None:
+                break
+            if piece % step == 0:
+                corpus.append((copy.deepcopy(board), best_Move))
+            if not apply_Move(board, best_Move):
+                break
+    return corpus
+
+# Times call(state) once for every corpus entry, repeated rounds times. setup(board, move) makes the states
+# for a round before it starts, so only the calls are timed. Returns the mean nanoseconds per call of the
+# fastest round, like timeit, since slower rounds are noise from the rest of the machine
+def time_Calls(corpus, setup, call, rounds):
+    round_Times = []
+    for _ in range(rounds):
+        states = [setup(board, move) for board, move in corpus]
+        gc.disable()    # Like timeit, so a collection of the setup garbage does not land in the timing
+        start_Time = time.perf_counter_ns()
+        for state in states:
+            call(state)
+        round_Times.append((time.perf_counter_ns() - start_Time) / len(states))
+        gc.enable()
+    return {"ns_per_call": min(round_Times), "calls": rounds * len(corpus)}
+
+# Puts a copy of the board's current tetrimino in the move's rotation and column, at the top of the grid
+def place_Move(board, move):
+    board = copy.deepcopy(board)
+    tetrimino = board.current_Tetrimino
+    tetrimino.set_Rotation(move[0])
+    tetrimino.x, tetrimino.y = move[1], 0
+    return board, tetrimino
+
+def land_Move(board, move):
+    board, tetrimino = place_Move(board, move)
+    tetrimino.y = board.get_Landing_Row(tetrimino)
+    return board, tetrimino
+
+def filled_Move(board, move):
+    board, tetrimino = land_Move(board, move)
+    board.add_Piece(tetrimino)
+    return board
+
+def run_Micro(corpus, rounds):
+    same = lambda board, move: board
+    greedy = lambda board, move: TetrisAI(board)
+    results = {
+        "board.is_valid_move": time_Calls(corpus, place_Move, lambda state: state[0].is_Valid_Move(state[1], 0, 1), rounds * 20),
+        "board.get_landing_row": time_Calls(corpus, place_Move, lambda state: state[0].get_Landing_Row(state[1]), rounds * 20),
+        "board.add_piece": time_Calls(corpus, land_Move, lambda state: state[0].add_Piece(state[1]), rounds * 5),
+        "board.clear_lines": time_Calls(corpus, filled_Move, lambda board: board.clear_Lines(), rounds * 5),
+        "board.recount_columns": time_Calls(corpus, same, lambda board: board.recount_Columns(), rounds * 5),
+        "ai.calculate_holes": time_Calls(corpus, greedy, lambda ai: ai.calculate_Holes(), rounds * 20),
+        "ai.calculate_bumpiness": time_Calls(corpus, greedy, lambda ai: ai.calculate_Bumpiness(), rounds * 20),
+        "ai.get_best_move": time_Calls(corpus, greedy, lambda ai: ai.get_Best_Move(), rounds),
+        "ai.get_best_move_beam": time_Calls(corpus, lambda board, move: TetrisAI(board, search_Depth=2, beam_Width=8),
+                                            lambda ai: ai.get_Best_Move(), rounds),
+    }
+    if np is not None:
+        results["ai.get_best_move_batched"] = time_Calls(corpus, lambda board, move: TetrisAI(board, batched=True),
+                                                         lambda ai: ai.get_Best_Move(), rounds)
+    return results
+
+# Plays seeded headless games once and returns the placements and the seconds they took
+def play_Games(seeds, max_Pieces, **options):
+    pieces = 0
+    start_Time = time.perf_counter()
+    for seed in seeds:
+        pieces += play_Headless_Game(max_Pieces=max_Pieces, seed=seed, **options)[3]
+    return pieces, time.perf_counter() - start_Time
+
+# Placements and games per second of the fastest of the timed rounds, like time_Calls
+def get_Game_Rates(seeds, pieces, round_Times):
+    elapsed = min(round_Times)
+    return {"games": len(seeds), "placements": pieces, "seconds": elapsed, "rounds": len(round_Times),
+            "placements_per_sec": pieces / elapsed, "games_per_sec": len(seeds) / elapsed}
+
+# Plays the seeded headless games rounds times and reports the placements and games per second of the fastest
+def time_Games(seeds, max_Pieces, rounds, **options):
+    round_Times = []
+    for _ in range(rounds):
+        pieces, elapsed = play_Games(seeds, max_Pieces, **options)
+        round_Times.append(elapsed)
+    return get_Game_Rates(seeds, pieces, round_Times)
+
+def run_Macro(num_Games, max_Pieces, rounds):
+    seeds = list(range(100, 100 + num_Games))
+    results = {
+        "headless.greedy": time_Games(seeds, max_Pieces, rounds),
+        "headless.beam_depth2": time_Games(seeds, max_Pieces, rounds, search_Depth=2, beam_Width=8),
+    }
+    if np is not None:
+        results["headless.batched"] = time_Games(seeds, max_Pieces, rounds, batched=True)
+
+    # The same seeds played by two weight sets sharing a transposition cache, the second set finds most boards cached
+    # The second set is also played without the cache, so the two runs show what the cache saves
+    # Every round starts with an empty cache, so each round of the first set fills it again
+    tuned_Weights = [DEFAULT_WEIGHTS[0] * 1.1] + DEFAULT_WEIGHTS[1:]
+    results["headless.greedy_second_weights"] = time_Games(seeds, max_Pieces, rounds, weights=tuned_Weights)
+    cached_Times = []
+    second_Times = []
+    for _ in range(rounds):
+        cache = TranspositionCache()
+        pieces, elapsed = play_Games(seeds, max_Pieces, cache=cache)
+        cached_Times.append(elapsed)
+        second_Pieces, elapsed = play_Games(seeds, max_Pieces, weights=tuned_Weights, cache=cache)
+        second_Times.append(elapsed)
+    results["headless.greedy_cached"] = get_Game_Rates(seeds, pieces, cached_Times)
+    results["headless.greedy_cached_second_weights"] = get_Game_Rates(seeds, second_Pieces, second_Times)
+    return results, cache.get_Stats()
+
+# A board with full_Rows full rows at the bottom and a ragged stack with one hole per row above them,
+# filling half the board, to time line clears on
+def build_Clear_Board(num_Columns, num_Rows, full_Rows=4, seed=0):
+    board = Board(num_Columns, num_Rows, seed)
+    choice = random.Random(seed)
+    for y in range(num_Rows // 2, num_Rows):
+        bits = board.full_Row
+        if y < num_Rows - full_Rows:
+            bits &= ~(1 << choice.randrange(num_Columns))
+        board.rows[y] = bits
+        board.grid[y] = [1 if bits >> x & 1 else 0 for x in range(num_Columns)]
+    board.recount_Columns()
+    board.rehash()
+    return board
+
+# Times AI decisions and line clears on bigger boards, per decision and per cell of the board
+# The greedy AI tries every column and each try only saves and puts back the piece's rows and the features of
+# the columns next to it, so a decision grows with the width and should cost less per cell on bigger boards
+def run_Scaling(num_Pieces, rounds, sizes=SCALING_SIZES):
+    results = {}
+    for num_Columns, num_Rows in sizes:
+        board = Board(num_Columns, num_Rows, 1)
+        ai = TetrisAI(board)
+        decisions = 0
+        elapsed = 0
+        for _ in range(num_Pieces):
+            start_Time = time.perf_counter_ns()
+            best_Move = ai.get_Best_Move()
+            elapsed += time.perf_counter_ns() - start_Time
+            decisions += 1
+            if best_Move is None or not apply_Move(board, best_Move):
+                break
+
+        clear_Board = build_Clear_Board(num_Columns, num_Rows)
+        clear = time_Calls([(clear_Board, None)], lambda board, move: board.copy(), lambda board: board.clear_Lines(), rounds * 20)
+        cells = num_Columns * num_Rows
+        results[f"{num_Columns}x{num_Rows}"] = {
+            "decisions": decisions,
+            "ns_per_decision": elapsed / decisions,
+            "ns_per_decision_cell": elapsed / decisions / cells,
+            "ns_per_clear": clear["ns_per_call"],
+            "ns_per_clear_cell": clear["ns_per_call"] / cells,
+        }
+    return results
+
+# Metrics where a bigger number is better, every other metric is a time where smaller is better
+def higher_Is_Better(metric):
+    return metric.endswith("_per_sec")
+
+# Flattens the results into {"section/name/metric": value} for the timing metrics that are compared
+def get_Metrics(results):
+    metrics = {}
+    for section in ("micro", "macro", "scaling"):
+        for name, values in results.get(section, {}).items():
+            for metric in ("ns_per_call", "placements_per_sec", "games_per_sec", "ns_per_decision", "ns_per_clear"):
+                if metric in values:
+                    metrics[f"{section}/{name}/{metric}"] = values[metric]
+    return metrics
+
+# Prints how each metric changed against the baseline and returns the ones that got worse by more than threshold
+def compare_Results(results, baseline, threshold):
+    regressions = []
+    current = get_Metrics(results)
+    for key, old in sorted(get_Metrics(baseline).items()):
+        if key not in current or not old:
+            continue
+        new = current[key]
+        change = (new - old) / old
+        worse = -change if higher_Is_Better(key) else change
+        flag = "REGRESSION" if worse > threshold else ""
+        print(f"{key:60} {old:14.1f} -> {new:14.1f} {change:+7.1%} {flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+def run_Benchmarks(quick=False):
+    rounds = 3 if quick else 5
+    num_Games = 2 if quick else 6
+    max_Pieces = 150 if quick else 400
+
+    start_Time = time.perf_counter()
+    corpus = build_Corpus(max_Pieces=150 if quick else 400)
+    micro = run_Micro(corpus, rounds)
+    macro, cache_Stats = run_Macro(num_Games, max_Pieces, rounds)
+    scaling = run_Scaling(40 if quick else 150, rounds)
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np is not None,
+            "corpus_positions": len(corpus),
+            "quick": quick,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seconds": time.perf_counter() - start_Time,
+        },
+        "micro": micro,
+        "macro": macro,
+        "scaling": scaling,
+        "cache": cache_Stats,
+    }
+
+def print_Results(results):
+    for name, values in results["micro"].items():
+        print(f"{name:40} {values['ns_per_call'] / 1000:10.2f} us/call")
+    for name, values in results["macro"].items():
+        print(f"{name:40} {values['placements_per_sec']:10.1f} placements/s {values['games_per_sec']:8.2f} games/s")
+    for name, values in results["scaling"].items():
+        print(f"{'scaling ' + name:40} {values['ns_per_decision'] / 1000:10.1f} us/decision "
+              f"({values['ns_per_decision_cell']:.0f} ns/cell) {values['ns_per_clear'] / 1000:8.1f} us/clear "
+              f"({values['ns_per_clear_cell']:.1f} ns/cell)")
+    cache = results["cache"]
+    print(f"{'transposition cache':40} {cache['hit_rate']:10.1%} hit rate, {cache['hits']} hits, "
+          f"{cache['misses']} misses, {cache['evictions']} evictions")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Tetris engine and AI")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown against the baseline, 0.15 is 15%%")
+    parser.add_argument("--quick", action="store_true", help="Smaller corpus and fewer games")
+    args = parser.parse_args()
+
+    results = run_Benchmarks(args.quick)
+    print_Results(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare_Results(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+            raise SystemExit(1)
+        print("No regressions against the baseline")
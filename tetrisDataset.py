@@ -0,0 +1,216 @@
+import argparse
+import multiprocessing
+import os
+import struct
+import time
+
+from tetrisFinal import Board, BOARD_WIDTH, BOARD_HEIGHT, DEFAULT_COST, COST_FUNCTIONS, TetrisAI, apply_Move, np
+
+# Supervised training data from AI self-play
+# Every position the AI decides on becomes one fixed-width record: the bitboard before the move, the current
+# and next piece, the chosen (rotation, x), its cost and the feature vector the cost was worked out from.
+# Records are streamed into a .npy file that grows as it fills, so np.load(path, mmap_mode='r') reads it
+# back without loading it, and any record or slice of records is a view into the file. Worker processes
+# keep one chunk of records each and write it straight into its own reserved part of the file when it is full
+
+# The .npy header takes a fixed 1KB, so it can be written again with the final record count
+HEADER_SIZE = 1024
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+CHUNK_SIZE = 4096   # Records each worker keeps before writing them out
+
+# One record per position. board holds the bitboard rows, bit x of a row in byte x // 8 at bit x % 8,
+# and columns is the board width they unpack to
+def get_Record_Dtype(num_Columns=BOARD_WIDTH, num_Rows=BOARD_HEIGHT):
+    row_Bytes = (num_Columns + 7) // 8
+    return np.dtype([
+        ("seed", "<u8"),
+        ("piece", "<u4"),           # Pieces placed in the game before this one
+        ("columns", "u1"),
+        ("current", "u1"),
+        ("next", "u1"),
+        ("rotation", "u1"),
+        ("x", "<i2"),
+        ("cost", "<f4"),
+        ("holes_created", "<i2"),
+        ("drop_height", "<i4"),
+        ("bumpiness", "<i4"),
+        ("lines_cleared", "u1"),
+        ("board", "u1", (num_Rows, row_Bytes)),
+    ])
+
+def write_Header(file, dtype, count):
+    header = repr({"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (count,)}).encode("latin1")
+    padding = HEADER_SIZE - len(NPY_MAGIC) - 2 - len(header) - 1
+    if padding < 0:
+        raise ValueError("Record layout too large for the dataset header")
+    file.seek(0)
+    file.write(NPY_MAGIC + struct.pack("<H", len(header) + padding + 1) + header + b" " * padding + b"\n")
+
+# Appends records to a dataset file, from this process or from worker processes it was passed to when they
+# were started. Each write reserves its slots under the lock, doubling the file when it is full, and then
+# writes the records through a memory map of just those slots, so writers never wait on each other's copies.
+# The header only gets the record count in close(), a file that was not closed reads as the records of its
+# last close
+class DatasetWriter:
+    def __init__(self, path, num_Columns=BOARD_WIDTH, num_Rows=BOARD_HEIGHT, capacity=65536):
+        self.path = path
+        self.dtype = get_Record_Dtype(num_Columns, num_Rows)
+        if os.path.exists(path):
+            records = open_Dataset(path)
+            if records.dtype != self.dtype:
+                raise ValueError(f"{path} holds records for a different board size")
+            count = capacity = len(records)
+            del records
+        else:
+            count = 0
+            with open(path, 'wb') as file:
+                write_Header(file, self.dtype, 0)
+                file.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+        self.count = multiprocessing.RawValue('q', count)
+        self.capacity = multiprocessing.RawValue('q', capacity)
+        self.lock = multiprocessing.Lock()
+
+    def __len__(self):
+        return self.count.value
+
+    # Writes a record array and returns the index of its first record
+    def write(self, records):
+        itemsize = self.dtype.itemsize
+        with self.lock:
+            start = self.count.value
+            end = start + len(records)
+            if end > self.capacity.value:
+                self.capacity.value = max(self.capacity.value * 2, end)
+                os.truncate(self.path, HEADER_SIZE + self.capacity.value * itemsize)
+            self.count.value = end
+        if len(records):
+            mapped = np.memmap(self.path, self.dtype, 'r+', HEADER_SIZE + start * itemsize, (len(records),))
+            mapped[:] = records
+            del mapped
+        return start
+
+    # Writes the record count into the header and cuts the file down to the records written
+    def close(self):
+        with self.lock:
+            with open(self.path, 'r+b') as file:
+                write_Header(file, self.dtype, self.count.value)
+                file.truncate(HEADER_SIZE + self.count.value * self.dtype.itemsize)
+            self.capacity.value = self.count.value
+
+# The records of a dataset file as a read only memory mapped array, nothing is read until it is indexed
+def open_Dataset(path):
+    return np.load(path, mmap_mode='r')
+
+# Boards of a record array as a (records, rows, columns) bool array
+def get_Boards(records):
+    planes = np.unpackbits(records["board"], axis=2, bitorder="little")
+    return planes[:, :, :int(records["columns"][0])].astype(bool) if len(records) else planes.astype(bool)
+
+# Plays one seeded AI game and writes a record for every position, a chunk of records at a time
+# Moves are the same the AI picks in get_Best_Move, the greedy search is run here to keep its features
+def export_Game(writer, seed, weights=None, cost=DEFAULT_COST, max_Pieces=None, num_Columns=BOARD_WIDTH,
+                num_Rows=BOARD_HEIGHT, chunk_Size=CHUNK_SIZE):
+    board = Board(num_Columns, num_Rows, seed)
+    ai = TetrisAI(board, weights, cost=cost)
+    row_Bytes = (num_Columns + 7) // 8
+    chunk = np.zeros(chunk_Size, dtype=writer.dtype)
+    filled = 0
+    pieces = 0
+    while max_Pieces is None or pieces < max_Pieces:
+        candidates = ai.get_Candidate_Features()
+        best_Move = ai.choose_Move(candidates)
+        if best_Move is None:
+            break
+        features = next(features for move, features in candidates if move == best_Move)
+        holes_Created, drop_Height, bumpiness, lines_Cleared = features
+
+        record = chunk[filled]
+        record["seed"] = seed
+        record["piece"] = pieces
+        record["columns"] = num_Columns
+        record["current"] = board.current_Tetrimino.kind
+        record["next"] = board.next_Tetrimino.kind
+        record["rotation"], record["x"] = best_Move
+        record["cost"] = ai.cost_Function(ai.weights, features)
+        record["holes_created"] = holes_Created
+        record["drop_height"] = drop_Height
+        record["bumpiness"] = bumpiness
+        record["lines_cleared"] = lines_Cleared
+        record["board"] = np.frombuffer(b"".join(bits.to_bytes(row_Bytes, "little") for bits in board.rows),
+                                        dtype=np.uint8).reshape(num_Rows, row_Bytes)
+        filled += 1
+        if filled == chunk_Size:
+            writer.write(chunk)
+            filled = 0
+
+        pieces += 1
+        if not apply_Move(board, best_Move):
+            break
+    writer.write(chunk[:filled])
+    return seed, board.score, board.lines_Cleared, pieces
+
+# Each worker process gets the writer once when it starts, its shared counters and lock can only be passed then
+worker_Writer = None
+
+def init_Worker(writer):
+    global worker_Writer
+    worker_Writer = writer
+
+def export_Seeded_Game(game):
+    return export_Game(worker_Writer, *game)
+
+# Plays num_Games AI games across a pool of worker processes, game i from seed + i, and streams every position
+# into the dataset file at path. An existing file is added to
+def export_Dataset(path, num_Games=100, workers=None, seed=0, max_Pieces=None, weights=None, cost=DEFAULT_COST,
+                   num_Columns=BOARD_WIDTH, num_Rows=BOARD_HEIGHT, chunk_Size=CHUNK_SIZE):
+    if np is None:
+        raise RuntimeError("NumPy is required to export datasets")
+    workers = workers or os.cpu_count() or 1
+    writer = DatasetWriter(path, num_Columns, num_Rows)
+    start_Count = len(writer)
+    games = [(seed + i, weights, cost, max_Pieces, num_Columns, num_Rows, chunk_Size) for i in range(num_Games)]
+
+    start_Time = time.perf_counter()
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=init_Worker, initargs=(writer,)) as pool:
+            results = list(pool.imap_unordered(export_Seeded_Game, games))
+    else:
+        results = [export_Game(writer, *game) for game in games]
+    writer.close()
+    elapsed = time.perf_counter() - start_Time
+
+    records = len(writer) - start_Count
+    print(f"{records} positions from {len(results)} games in {elapsed:.1f}s ({records / elapsed:.0f} positions/s), "
+          f"{len(writer)} in {path} ({os.path.getsize(path) / 1e6:.1f}MB)")
+    return records
+
+def print_Info(path, index=None):
+    records = open_Dataset(path)
+    print(f"{path}: {len(records)} positions of {records.dtype.itemsize} bytes, "
+          f"{len(np.unique(records['seed']))} games")
+    if index is not None:
+        record = records[index]
+        print(f"Position {index}: seed {record['seed']} piece {record['piece']}, current {record['current']} "
+              f"next {record['next']}, move ({record['rotation']}, {record['x']}) cost {record['cost']:.2f}, "
+              f"holes created {record['holes_created']} drop height {record['drop_height']} "
+              f"bumpiness {record['bumpiness']} lines {record['lines_cleared']}")
+        for row in get_Boards(records[index:index + 1])[0]:
+            print("".join("#" if cell else "." for cell in row))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export AI self-play positions as a memory mapped training dataset")
+    parser.add_argument("command", choices=["export", "info"], help="export AI games to the dataset, or describe it")
+    parser.add_argument("dataset", help="Dataset .npy file, exports add to an existing one")
+    parser.add_argument("--games", type=int, default=100, help="Games to export")
+    parser.add_argument("--workers", type=int, help="Worker processes, defaults to every core")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first game, game i uses seed + i")
+    parser.add_argument("--max-pieces", type=int, help="Pieces per game before it is stopped")
+    parser.add_argument("--cost", choices=list(COST_FUNCTIONS), default=DEFAULT_COST, help="Cost function of the AI")
+    parser.add_argument("--weights", type=float, nargs=4, metavar=("HOLES", "BUMPINESS", "DROP", "LINES"), help="AI weights")
+    parser.add_argument("--index", type=int, help="Position to show with info")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_Dataset(args.dataset, args.games, args.workers, args.seed, args.max_pieces, args.weights, args.cost)
+    else:
+        print_Info(args.dataset, args.index)
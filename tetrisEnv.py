@@ -0,0 +1,157 @@
+import argparse
+import random
+import time
+
+from tetrisFinal import Board, BOARD_WIDTH, BOARD_HEIGHT, SHAPE_ROTATIONS, apply_Move, np
+
+# Gym style environment that plays many independent games at once, for training learned agents
+# An action places the current tetrimino straight down in a rotation (0-3) with its leftmost cell in a column,
+# the same moves the AI makes. Every step takes one action per game and fills preallocated arrays with the
+# observations, the guideline score each placement earned as its reward and whether the game ended. A game
+# that ends is reset right away with the next seed, so the observation of a finished game is its new start
+# Placements go through apply_Move like the headless games, so every board stays a complete Board the AI can play on
+
+class TetrisVecEnv:
+    def __init__(self, num_Envs, seed=0, num_Columns=BOARD_WIDTH, num_Rows=BOARD_HEIGHT):
+        if np is None:
+            raise RuntimeError("NumPy is required for the vectorized environment")
+        if num_Columns > 63:
+            raise ValueError("The environment unpacks rows as 64 bit integers, boards can be at most 63 columns wide")
+        self.num_Envs = num_Envs
+        self.num_Columns = num_Columns
+        self.num_Rows = num_Rows
+        self.next_Seed = seed
+        self.boards = []
+        self.episode_Pieces = []    # Pieces placed in each game so far
+
+        # Observations, rewards and done flags are written into these arrays in place on every step,
+        # copy them if they need to be kept past the next step
+        self.heights = np.zeros((num_Envs, num_Columns), dtype=np.int16)
+        self.holes = np.zeros(num_Envs, dtype=np.int16)
+        self.grid = np.zeros((num_Envs, num_Rows, num_Columns), dtype=np.uint8)   # 1 where a cell is filled
+        self.pieces = np.zeros((num_Envs, 2), dtype=np.int8)    # Kinds of the current and next tetrimino
+        self.rewards = np.zeros(num_Envs, dtype=np.float32)
+        self.dones = np.zeros(num_Envs, dtype=bool)
+        self.action_Mask = np.zeros((num_Envs, 4, num_Columns), dtype=bool)
+
+        # Work arrays to unpack the bitboard rows of every game into the grid bitplanes in one go
+        self.rows = np.zeros((num_Envs, num_Rows), dtype=np.int64)
+        self.bits = np.zeros((num_Envs, num_Rows, num_Columns), dtype=np.int64)
+        self.column_Shifts = np.arange(num_Columns, dtype=np.int64)
+
+        # Score and pieces of the last game each environment finished
+        self.final_Scores = np.zeros(num_Envs, dtype=np.int64)
+        self.final_Pieces = np.zeros(num_Envs, dtype=np.int64)
+
+    def new_Board(self):
+        board = Board(self.num_Columns, self.num_Rows, self.next_Seed)
+        self.next_Seed += 1
+        return board
+
+    # Starts every game again, game i from seed + i when a seed is given
+    def reset(self, seed=None):
+        if seed is not None:
+            self.next_Seed = seed
+        self.boards = [self.new_Board() for _ in range(self.num_Envs)]
+        self.episode_Pieces = [0] * self.num_Envs
+        self.rewards[:] = 0
+        self.dones[:] = False
+        for i in range(self.num_Envs):
+            self.write_Observation(i)
+        self.write_Grid()
+        return self.get_Observations()
+
+    # actions is one (rotation, column) per game, as a list or an (num_Envs, 2) integer array
+    # A placement that does not fit at the top of the grid ends the game, like a tetrimino that cannot spawn
+    def step(self, actions):
+        if hasattr(actions, "tolist"):
+            actions = actions.tolist()
+        boards = self.boards
+        episode_Pieces = self.episode_Pieces
+        rewards = self.rewards
+        dones = self.dones
+        for i, (rotation, column) in enumerate(actions):
+            board = boards[i]
+            tetrimino = board.current_Tetrimino
+            score = board.score
+            tetrimino.set_Rotation(int(rotation))
+            tetrimino.x, tetrimino.y = int(column) - tetrimino.rotation_Entry.min_x, 0
+            running = board.is_Valid_Move(tetrimino, 0, 0)
+            if running:
+                running = apply_Move(board, (tetrimino.rotation, tetrimino.x))
+                episode_Pieces[i] += 1
+            rewards[i] = board.score - score
+            dones[i] = not running
+            if not running:
+                self.final_Scores[i] = board.score
+                self.final_Pieces[i] = episode_Pieces[i]
+                episode_Pieces[i] = 0
+                boards[i] = self.new_Board()
+            self.write_Observation(i)
+
+        self.write_Grid()
+        return self.get_Observations(), self.rewards, self.dones
+
+    # Writes game i's column heights, holes, bitboard rows and pieces into its row of the arrays
+    def write_Observation(self, i):
+        board = self.boards[i]
+        self.heights[i] = board.heights
+        self.holes[i] = board.holes
+        self.rows[i] = board.rows
+        self.pieces[i, 0] = board.current_Tetrimino.kind
+        self.pieces[i, 1] = board.next_Tetrimino.kind
+
+    # Bitplanes of every game from the bitboard rows, bit x of a row is column x
+    def write_Grid(self):
+        np.right_shift(self.rows[:, :, None], self.column_Shifts, out=self.bits)
+        np.bitwise_and(self.bits, 1, out=self.bits)
+        self.grid[:] = self.bits
+
+    def get_Observations(self):
+        return {"heights": self.heights, "holes": self.holes, "grid": self.grid, "pieces": self.pieces}
+
+    # Fills action_Mask with the (rotation, column) actions that fit at the top of each game's grid
+    # Not part of step() since it costs more than a placement, call it when an agent needs it
+    def get_Action_Mask(self):
+        self.action_Mask[:] = False
+        for i, board in enumerate(self.boards):
+            tetrimino = board.current_Tetrimino
+            original = (tetrimino.x, tetrimino.y, tetrimino.rotation)
+            tetrimino.y = 0
+            for rotation in SHAPE_ROTATIONS[tetrimino.kind]:
+                tetrimino.set_Rotation(rotation.index)
+                for column in range(self.num_Columns - rotation.width + 1):
+                    tetrimino.x = column - rotation.min_x
+                    self.action_Mask[i, rotation.index, column] = board.is_Valid_Move(tetrimino, 0, 0)
+            tetrimino.x, tetrimino.y = original[0], original[1]
+            tetrimino.set_Rotation(original[2])
+        return self.action_Mask
+
+# Steps the environments with random legal actions and reports placements per second
+def run_Random_Agent(num_Envs, num_Steps, seed=0):
+    env = TetrisVecEnv(num_Envs, seed)
+    env.reset()
+    choice = random.Random(seed)
+    actions = np.zeros((num_Envs, 2), dtype=np.int64)
+    games = 0
+    elapsed = 0.0
+    for _ in range(num_Steps):
+        mask = env.get_Action_Mask()
+        for i in range(num_Envs):
+            legal = np.argwhere(mask[i])
+            actions[i] = legal[choice.randrange(len(legal))] if len(legal) else (0, 0)
+        start_Time = time.perf_counter()
+        observations, rewards, dones = env.step(actions)
+        elapsed += time.perf_counter() - start_Time
+        games += int(dones.sum())
+    placements = num_Envs * num_Steps
+    print(f"{placements} placements in {elapsed:.2f}s of stepping ({placements / elapsed:.0f} placements/s), "
+          f"{games} games finished")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Step many Tetris games at once with random legal actions")
+    parser.add_argument("--envs", type=int, default=256, help="Games stepped together")
+    parser.add_argument("--steps", type=int, default=200, help="Steps to run")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first game")
+    args = parser.parse_args()
+    run_Random_Agent(args.envs, args.steps, args.seed)
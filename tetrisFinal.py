@@ -1,9 +1,30 @@
-import pygame
+import argparse
+import copy
+import json
+import multiprocessing
+import os
 import random
-
-# Initialize Pygame
-pygame.init()
-pygame.font.init()
+import struct
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from operator import sub
+
+from tetrisResults import ResultsWriter
+from tetrisStats import SearchStats
+
+# NumPy is only needed for the batched AI evaluator
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Pygame is only needed for the windowed game, the headless engine runs without it
+try:
+    import pygame
+except ImportError:
+    pygame = None
 
 # Screen dimensions
 SCREEN_WIDTH = 300
@@ -11,6 +32,18 @@ SCREEN_HEIGHT = 660
 GRID_SIZE = 30
 UI_WIDTH = 250
 
+# Default board size in cells, the engine works in cells and any size can be played headless
+BOARD_WIDTH = SCREEN_WIDTH // GRID_SIZE
+BOARD_HEIGHT = SCREEN_HEIGHT // GRID_SIZE
+
+# Drop heights are costed in the 30 pixel units of the old pixel engine, which the AI weights were tuned with
+DROP_HEIGHT_UNIT = 30
+
+# The windowed game's simulation advances in fixed steps, and frames are drawn at most FRAME_RATE times a second
+SIMULATION_STEP = 0.001
+FRAME_RATE = 60
+MAX_FRAME_TIME = 0.25   # Longer frames are cut short, so a stall does not have to be caught up all at once
+
 # Colours for pieces
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -54,24 +87,195 @@ SHAPES = [
      [7, 7]],
 ]
 
+# Hand tuned weights for holes, bumpiness, drop height and lines cleared
+DEFAULT_WEIGHTS = [3.0, 0.5, 0.3, 8.5]
+
 # Indexing the colours to be used later for each tetrimino
 SHAPE_COLOURS = [PURPLE, RED, GREEN, PINK, ORANGE, CYAN, YELLOW]
 
+# One rotation of a tetrimino, worked out once at startup so rotating in game is just a table lookup
+class Rotation:
+    def __init__(self, shape, index):
+        self.shape = shape
+        self.index = index  # Number of clockwise turns from the spawn orientation
+
+        columns = [x for row in shape for x, value in enumerate(row) if value]
+        self.min_x = min(columns)
+        self.max_x = max(columns)
+        self.width = self.max_x - self.min_x + 1
+
+        # Bitboard masks, bit 0 of each row mask is the leftmost filled column of the shape
+        row_Masks = []
+        for y, row in enumerate(shape):
+            bits = 0
+            for x, value in enumerate(row):
+                if value:
+                    bits |= 1 << (x - self.min_x)
+            if bits:
+                row_Masks.append((y, bits))
+        self.row_Masks = tuple(row_Masks)
+        self.masks = (self.min_x, self.max_x, self.row_Masks)
+
+        # Filled rows in each column, the lowest one is used to find the landing row from the column heights
+        self.column_Cells = tuple(tuple(y for y, row in enumerate(shape) if row[x]) for x in range(self.min_x, self.max_x + 1))
+        self.bottoms = tuple(cells[-1] for cells in self.column_Cells)
+
+        # (y, x, value) of every filled cell of the shape, so placing a piece on the grid only visits its 4 cells
+        self.filled_Cells = tuple((y, x, value) for y, row in enumerate(shape) for x, value in enumerate(row) if value)
+
+        # The filled cells moved to the top left corner, rotations with the same cells land the same way
+        min_y = self.row_Masks[0][0]
+        self.cells = frozenset((y - min_y, x - self.min_x) for y, row in enumerate(shape) for x, value in enumerate(row) if value)
+
+# Builds all four clockwise rotations of every shape, and the distinct ones the AI needs to try
+# The O piece only has 1 distinct rotation and the I, S and Z pieces have 2
+def build_Rotation_Tables():
+    all_Rotations = []
+    distinct_Rotations = []
+    for shape in SHAPES:
+        rotations = []
+        for index in range(4):
+            rotations.append(Rotation(shape, index))
+            shape = [list(row) for row in zip(*shape[::-1])]
+        all_Rotations.append(rotations)
+
+        distinct = []
+        for rotation in rotations:
+            if all(rotation.cells != other.cells for other in distinct):
+                distinct.append(rotation)
+        distinct_Rotations.append(distinct)
+    return all_Rotations, distinct_Rotations
+
+SHAPE_ROTATIONS, DISTINCT_ROTATIONS = build_Rotation_Tables()
+
+# For every rotation, the distinct rotation with the same cells and the (dx, dy) that moves a position in it onto
+# the same cells in the distinct one, so a placement reached in two rotations is only kept once
+def build_Canonical_Rotations():
+    canonical_Rotations = []
+    for rotations, distinct in zip(SHAPE_ROTATIONS, DISTINCT_ROTATIONS):
+        canonical = []
+        for rotation in rotations:
+            same = next(other for other in distinct if other.cells == rotation.cells)
+            canonical.append((same.index, rotation.min_x - same.min_x, rotation.row_Masks[0][0] - same.row_Masks[0][0]))
+        canonical_Rotations.append(canonical)
+    return canonical_Rotations
+
+CANONICAL_ROTATIONS = build_Canonical_Rotations()
+
+# Kicks tried when a rotation does not fit where it is, in the order adjust_For_Rotation tries them
+ROTATION_KICKS = (0, -1, 1, -2, 2)
+
+# Zobrist keys, a random 64 bit number for every cell. A board's hash is the XOR of the keys of its filled cells,
+# so placing a piece only XORs in its new cells. The keys are seeded so hashes match across processes
+ZOBRIST_KEYS = {}
+
+def get_Zobrist_Keys(num_Rows, num_Columns):
+    keys = ZOBRIST_KEYS.get((num_Rows, num_Columns))
+    if keys is None:
+        generator = random.Random(0x7E7815)
+        keys = ZOBRIST_KEYS[(num_Rows, num_Columns)] = [[generator.getrandbits(64) for x in range(num_Columns)] for y in range(num_Rows)]
+    return keys
+
+# Bounded least recently used cache from a board hash to the features the AI worked out for that board
+# The weights are applied after the lookup, so one cache can be shared by AIs with different weights
+class TranspositionCache:
+    def __init__(self, max_Size=100000):
+        self.max_Size = max_Size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        if len(self.entries) > self.max_Size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def hit_Rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get_Stats(self):
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hit_Rate()}
+
+# Board snapshots are a fixed size for a given board size, so a batch of them can live in one flat buffer
+# The header holds the counters, pieces, bag and board features, followed by one byte per grid cell (its shape
+# value, 0 when empty), the bitboard rows, the column heights and holes and, in full snapshots, the state of the
+# board's Mersenne Twister. Compact snapshots leave that out and get the generator back by drawing the same
+# number of bags again from the seed
+SNAPSHOT_VERSION = 2
+SNAPSHOT_RANDOM = 1     # Flag set when the generator state is included
+SNAPSHOT_HEADER = struct.Struct("<BBBBQQQIBBhhBB7sQHH")
+SNAPSHOT_RANDOM_STATE = struct.Struct("<625Id")
+
+def get_Snapshot_Size(num_Columns, num_Rows, with_Random=True):
+    row_Bytes = (num_Columns + 7) // 8
+    size = SNAPSHOT_HEADER.size + num_Columns * num_Rows + row_Bytes * num_Rows + 2 * num_Columns
+    return size + SNAPSHOT_RANDOM_STATE.size if with_Random else size
+
+# Everything Board.apply_Placement changes, so Board.undo can put the board back in place
+# The AI makes one record and fills it in again for every candidate it tries, its lists are sized for the largest
+# piece and the board's width once and never rebuilt
+class UndoRecord:
+    def __init__(self, num_Columns):
+        # The first row the piece was placed on, and the bits of its rows before it
+        self.top = 0
+        self.row_Bits = [0] * 4
+        self.row_Count = 0
+
+        # Column features before the piece, and the holes with it placed before any lines are cleared
+        # Only columns start to end are saved, the ones next to the piece, unless lines were cleared
+        self.start = 0
+        self.end = 0
+        self.heights = [0] * num_Columns
+        self.column_Holes = [0] * num_Columns
+        self.holes = 0
+        self.bumpiness = 0
+        self.hash = 0
+        self.placed_Holes = 0
+
+        # Rows cleared, from the top down
+        self.cleared_Rows = [0] * 4
+        self.lines_Cleared = 0
+
+        # What the cleared lines added to the score and level
+        self.score_Delta = 0
+        self.level_Delta = 0
+
 # Tetrimino class responsible for drawing the pieces and rotation
 class Tetrimino:
     def __init__(self, shape, colour=None):
-        self.shape = shape
-        self.colour = SHAPE_COLOURS[SHAPES.index(self.shape)]   # Assigns a colour to each tetrimino depending on its index
-        self.x = SCREEN_WIDTH // 2
+        self.kind = SHAPES.index(shape)
+        self.colour = SHAPE_COLOURS[self.kind]   # Assigns a colour to each tetrimino depending on its index
+        self.set_Rotation(0)
+        self.x = BOARD_WIDTH // 2   # Column and row of the top left of the shape, the board moves it to its own middle
         self.y = 0
 
+    # Looks the rotation up in the precomputed tables instead of building a new shape
+    def set_Rotation(self, rotation):
+        self.rotation = rotation % 4
+        self.rotation_Entry = SHAPE_ROTATIONS[self.kind][self.rotation]
+        self.shape = self.rotation_Entry.shape
+        self.masks = self.rotation_Entry.masks
+
     # Rotate 90 degrees clockwise
     def rotate(self):
-        self.shape = [list(row) for row in zip(*self.shape[::-1])]
+        self.set_Rotation(self.rotation + 1)
 
     # Rotate 90 degrees anti-clockwise
     def rotate_Anti_Clockwise(self):
-        self.shape = [list(row) for row in zip(*self.shape)][::-1]
+        self.set_Rotation(self.rotation - 1)
     
     # This reads the data in the screen parameter and draws the tetrimino
     def draw(self, screen, offset_x, offset_y):
@@ -80,23 +284,42 @@ class Tetrimino:
                 if value != 0:
                     pygame.draw.rect(screen, self.colour, (offset_x + x * GRID_SIZE, offset_y + y * GRID_SIZE, GRID_SIZE, GRID_SIZE))
 
+# The board and every tetrimino position on it are in cells, drawing them is left to the Renderer
 class Board:
-    def __init__(self, screen_Width, screen_Height, grid_Size):
-
-        num_Columns = screen_Width // grid_Size
-        num_Rows = screen_Height // grid_Size
+    def __init__(self, num_Columns=BOARD_WIDTH, num_Rows=BOARD_HEIGHT, seed=None):
         self.grid = []
         for i in range(num_Rows):
             row = [0] * num_Columns
             self.grid.append(row)
+        self.grid_Version = 0   # Goes up whenever the grid above changes, so the renderer knows to redraw it
+
+        # Bitboard of the grid, each row is an integer with bit x set when column x is filled
+        # The grid above keeps the tetrimino values so the colours can still be drawn
+        self.rows = [0] * num_Rows
+        self.full_Row = (1 << num_Columns) - 1
+        self.num_Columns = num_Columns
+        self.num_Rows = num_Rows
+
+        # Column features kept up to date as pieces are added and lines cleared, so the AI can read them directly
+        self.heights = [0] * num_Columns
+        self.column_Holes = [0] * num_Columns
+        self.holes = 0
+        self.bumpiness = 0
+
+        # Zobrist hash of the bitboard, kept up to date as pieces are added
+        self.zobrist_Keys = get_Zobrist_Keys(num_Rows, num_Columns)
+        self.hash = 0
 
-        self.screen_Width = screen_Width
-        self.screen_Height = screen_Height
-        self.grid_Size = grid_Size
         self.lines_Cleared = 0
         self.score = 0
         self.level = 1
 
+        # Each board has its own seeded random generator, so the same seed always gives the same pieces
+        # Without a seed one is picked at random and kept, so any game can still be replayed
+        self.seed = seed if seed is not None else int.from_bytes(os.urandom(8), "little")
+        self.random = random.Random(self.seed)
+        self.bags_Drawn = 0
+
         # Bag is responsible for the 7 bag randomizer used in original Tetris games
         self.bag = self.get_New_Bag()
 
@@ -106,42 +329,255 @@ class Board:
 
     # Refills the bag with a new bag full of tetrimino pieces
     def get_New_Bag(self):
-        return random.sample(SHAPES, len(SHAPES))
+        self.bags_Drawn += 1
+        return self.random.sample(SHAPES, len(SHAPES))
 
     def get_Next_Tetrimino(self):
         if not self.bag:    # If the bag is empty then it will refill the bag
             self.bag = self.get_New_Bag()
         shape = self.bag.pop()  # Otherwise it will take a tetrimino out of the bag and return it
-        return Tetrimino(shape)
+        return self.new_Tetrimino(SHAPES.index(shape))
+
+    # A tetrimino of the given kind at the spawn position, the middle column of the top row
+    def new_Tetrimino(self, kind):
+        tetrimino = Tetrimino(SHAPES[kind])
+        tetrimino.x = self.num_Columns // 2
+        return tetrimino
+
+    # Kinds of the next count tetriminos, the next one followed by the rest of the current bag
+    def get_Preview(self, count):
+        preview = [self.next_Tetrimino.kind] + [SHAPES.index(shape) for shape in reversed(self.bag)]
+        return preview[:count]
+
+    # Snapshots only hold the bitboard and column features, so saving and restoring the board is a tuple copy
+    def snapshot(self):
+        return tuple(self.rows), tuple(self.heights), tuple(self.column_Holes), self.holes, self.bumpiness, self.hash
+
+    def restore(self, snapshot):
+        rows, heights, column_Holes, self.holes, self.bumpiness, self.hash = snapshot
+        self.rows = list(rows)
+        self.heights = list(heights)
+        self.column_Holes = list(column_Holes)
+
+    # Independent copy of the board that the AI can search on while this one is drawn and played
+    # The Zobrist keys are shared, everything the game changes is copied
+    def copy(self):
+        board = copy.copy(self)
+        board.grid = [list(row) for row in self.grid]
+        board.rows = list(self.rows)
+        board.heights = list(self.heights)
+        board.column_Holes = list(self.column_Holes)
+        board.bag = list(self.bag)
+        board.random = random.Random()
+        board.random.setstate(self.random.getstate())
+        board.current_Tetrimino = copy.copy(self.current_Tetrimino)
+        board.next_Tetrimino = copy.copy(self.next_Tetrimino)
+        return board
+
+    # Writes the board's snapshot into buffer at offset, see SNAPSHOT_HEADER for the layout
+    def write_Bytes(self, buffer, offset=0, with_Random=True):
+        current = self.current_Tetrimino
+        SNAPSHOT_HEADER.pack_into(
+            buffer, offset, SNAPSHOT_VERSION, self.num_Columns, self.num_Rows,
+            SNAPSHOT_RANDOM if with_Random else 0, self.seed, self.bags_Drawn, self.score, self.lines_Cleared,
+            current.kind, current.rotation, current.x, current.y,
+            self.next_Tetrimino.kind, len(self.bag), bytes(SHAPES.index(shape) for shape in self.bag),
+            self.hash, self.holes, self.bumpiness)
+        offset += SNAPSHOT_HEADER.size
+
+        row_Bytes = (self.num_Columns + 7) // 8
+        body = b"".join((bytes(chain.from_iterable(self.grid)),
+                         b"".join(bits.to_bytes(row_Bytes, "little") for bits in self.rows),
+                         bytes(self.heights), bytes(self.column_Holes)))
+        buffer[offset:offset + len(body)] = body
+        if with_Random:
+            version, internal_State, gauss = self.random.getstate()
+            SNAPSHOT_RANDOM_STATE.pack_into(buffer, offset + len(body), *internal_State,
+                                            float("nan") if gauss is None else gauss)
+
+    def to_bytes(self, with_Random=True):
+        buffer = bytearray(get_Snapshot_Size(self.num_Columns, self.num_Rows, with_Random))
+        self.write_Bytes(buffer, 0, with_Random)
+        return bytes(buffer)
+
+    # Builds a board from a snapshot in any bytes-like object, such as one record of a SnapshotBatch
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        (version, num_Columns, num_Rows, flags, seed, bags_Drawn, score, lines_Cleared,
+         current_Kind, current_Rotation, current_x, current_y, next_Kind, bag_Length, bag,
+         board_Hash, holes, bumpiness) = SNAPSHOT_HEADER.unpack_from(data, offset)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError("Not a board snapshot, or a snapshot from a different version")
+        board = cls(num_Columns, num_Rows, seed)
+        board.score = score
+        board.lines_Cleared = lines_Cleared
+        board.level = min(lines_Cleared // 10 + 1, 29)  # The level always follows from the lines, as in clear_Lines
+        board.hash = board_Hash
+        board.holes = holes
+        board.bumpiness = bumpiness
+
+        offset += SNAPSHOT_HEADER.size
+        row_Bytes = (num_Columns + 7) // 8
+        cells = num_Columns * num_Rows
+        body = bytes(data[offset:offset + cells + row_Bytes * num_Rows + 2 * num_Columns])
+        board.grid = [list(body[y * num_Columns:(y + 1) * num_Columns]) for y in range(num_Rows)]
+        board.rows = [int.from_bytes(body[cells + y * row_Bytes:cells + (y + 1) * row_Bytes], "little")
+                      for y in range(num_Rows)]
+        heights_Start = cells + row_Bytes * num_Rows
+        board.heights = list(body[heights_Start:heights_Start + num_Columns])
+        board.column_Holes = list(body[heights_Start + num_Columns:])
+
+        if flags & SNAPSHOT_RANDOM:
+            state = SNAPSHOT_RANDOM_STATE.unpack_from(data, offset + len(body))
+            gauss = None if state[-1] != state[-1] else state[-1]  # NaN stands for no gauss value
+            board.random.setstate((3, state[:-1], gauss))
+            board.bags_Drawn = bags_Drawn
+        else:
+            while board.bags_Drawn < bags_Drawn:
+                board.get_New_Bag()
+        board.bag = [SHAPES[kind] for kind in bag[:bag_Length]]
+
+        board.current_Tetrimino = Tetrimino(SHAPES[current_Kind])
+        board.current_Tetrimino.set_Rotation(current_Rotation)
+        board.current_Tetrimino.x = current_x
+        board.current_Tetrimino.y = current_y
+        board.next_Tetrimino = board.new_Tetrimino(next_Kind)
+        return board
     
-    # This adds a piece to the board, by looking for non-zero values and updating the grid
+    # This adds a piece to the board, by writing the shape's filled cells into the grid
     def add_Piece(self, tetrimino):
-        for y, row in enumerate(tetrimino.shape):
-            for x, value in enumerate(row):
-                if value != 0:
-                    grid_x = (tetrimino.x // self.grid_Size) + x
-                    grid_y = (tetrimino.y // self.grid_Size) + y
-
-                    # This checks whether the position is within bounds or not, exception is raised if it's not
-                    if 0 <= grid_x < len(self.grid[0]) and 0 <= grid_y < len(self.grid):
-                        self.grid[grid_y][grid_x] = value
-                    else:
-                        raise IndexError("Trying to add piece out of bounds")
-                        
+        self.place_Bits(tetrimino)
+        grid = self.grid
+        for y, x, value in tetrimino.rotation_Entry.filled_Cells:
+            grid[tetrimino.y + y][tetrimino.x + x] = value
+        self.grid_Version += 1
+
+    # Adds a piece to the bitboard only, used by the AI when simulating placements
+    def place_Bits(self, tetrimino):
+        min_x, max_x, row_Masks = tetrimino.masks
+        grid_x = tetrimino.x
+        grid_y = tetrimino.y
+
+        # This checks whether the position is within bounds or not, exception is raised if it's not
+        if grid_x + min_x < 0 or grid_x + max_x >= self.num_Columns:
+            raise IndexError("Trying to add piece out of bounds")
+        for y, bits in row_Masks:
+            if not 0 <= grid_y + y < self.num_Rows:
+                raise IndexError("Trying to add piece out of bounds")
+        for y, bits in row_Masks:
+            y += grid_y
+            bits <<= grid_x + min_x
+            new_Bits = bits & ~self.rows[y]
+            self.rows[y] |= bits
+
+            # XOR the keys of the newly filled cells into the hash
+            keys = self.zobrist_Keys[y]
+            while new_Bits:
+                low_Bit = new_Bits & -new_Bits
+                self.hash ^= keys[low_Bit.bit_length() - 1]
+                new_Bits ^= low_Bit
+
+        # Only the columns under the piece change, so the features are updated from their differences
+        rotation = tetrimino.rotation_Entry
+        left = grid_x + min_x
+        bumpiness_Before = self.get_Local_Bumpiness(left, rotation.width)
+        for x, cells in enumerate(rotation.column_Cells):
+            column = left + x
+            top = self.num_Rows - self.heights[column]
+            piece_Top = grid_y + cells[0]
+
+            # Empty cells left under the piece become holes, cells placed below the top of the column fill holes
+            if grid_y + cells[-1] < top:
+                holes_Change = top - piece_Top - len(cells)
+                self.heights[column] = self.num_Rows - piece_Top
+            else:
+                holes_Change = -sum(1 for y in cells if grid_y + y > top)
+                if piece_Top < top:
+                    holes_Change += top - piece_Top - 1 - sum(1 for y in cells if piece_Top < grid_y + y < top)
+                    self.heights[column] = self.num_Rows - piece_Top
+            self.column_Holes[column] += holes_Change
+            self.holes += holes_Change
+        self.bumpiness += self.get_Local_Bumpiness(left, rotation.width) - bumpiness_Before
+
+    # Sum of the height differences between each column in the range and its neighbours
+    def get_Local_Bumpiness(self, left, width):
+        heights = self.heights
+        start = max(left - 1, 0)
+        end = min(left + width, self.num_Columns - 1)
+        return sum(map(abs, map(sub, heights[start:end], heights[start + 1:end + 1])))
+
+    # Works the Zobrist hash out again from the bitboard, only needed after lines are cleared
+    def rehash(self):
+        board_Hash = 0
+        for keys, bits in zip(self.zobrist_Keys, self.rows):
+            while bits:
+                low_Bit = bits & -bits
+                board_Hash ^= keys[low_Bit.bit_length() - 1]
+                bits ^= low_Bit
+        self.hash = board_Hash
+
+    # Works the column features out again from the bitboard, only needed after lines are cleared
+    # The lists are filled in place, snapshots hold tuples so none of them are changed
+    def recount_Columns(self):
+        heights = self.heights
+        column_Holes = self.column_Holes
+        for x in range(self.num_Columns):
+            heights[x] = 0
+            column_Holes[x] = 0
+        covered = 0
+        for y, bits in enumerate(self.rows):
+            new_Bits = bits & ~covered  # Columns whose highest filled cell is on this row
+            hole_Bits = covered & ~bits     # Empty cells with a filled cell above them
+            covered |= bits
+            while new_Bits:
+                low_Bit = new_Bits & -new_Bits
+                heights[low_Bit.bit_length() - 1] = self.num_Rows - y
+                new_Bits ^= low_Bit
+            while hole_Bits:
+                low_Bit = hole_Bits & -hole_Bits
+                column_Holes[low_Bit.bit_length() - 1] += 1
+                hole_Bits ^= low_Bit
+        self.holes = sum(column_Holes)
+        self.bumpiness = sum(abs(heights[x] - heights[x + 1]) for x in range(self.num_Columns - 1))
+
+    # Returns the grid row the tetrimino would land on if dropped straight down
+    # When the piece is above the stack the landing row comes from the column heights and the bottom of each
+    # column of the piece, without stepping down row by row
+    def get_Landing_Row(self, tetrimino):
+        heights = self.heights
+        rotation = tetrimino.rotation_Entry
+        grid_x = tetrimino.x + rotation.min_x
+        grid_y = tetrimino.y
+        if grid_x >= 0 and grid_x + rotation.width <= self.num_Columns:
+            landing_Row = min(self.num_Rows - heights[grid_x + x] - 1 - bottom for x, bottom in enumerate(rotation.bottoms))
+            if landing_Row >= grid_y:
+                return landing_Row
+
+        # The piece is tucked under part of the stack, so lower it one row at a time
+        original_y = tetrimino.y
+        while self.is_Valid_Move(tetrimino, 0, 1):
+            tetrimino.y += 1
+        landing_Row = tetrimino.y
+        tetrimino.y = original_y
+        return landing_Row
+
     # This function checks if move proposed is within bounds
     # Very important for rotation and the implementation of the Super Rotation System
     def is_Valid_Move(self, tetrimino, dx, dy):
-        for y, row in enumerate(tetrimino.shape):
-            for x, value in enumerate(row):
-                if value:
-                    new_x = (tetrimino.x // self.grid_Size) + x + dx
-                    new_y = (tetrimino.y // self.grid_Size) + y + dy
-
-                    # Similar to add Piece, it checks if it is within bounds
-                    if new_x < 0 or new_x >= self.screen_Width // self.grid_Size or new_y < 0 or new_y >= self.screen_Height // self.grid_Size:
-                        return False
-                    if self.grid[new_y][new_x]:
-                        return False
+        min_x, max_x, row_Masks = tetrimino.masks
+        new_x = tetrimino.x + dx
+        new_y = tetrimino.y + dy
+
+        # Similar to add Piece, it checks if it is within bounds
+        if new_x + min_x < 0 or new_x + max_x >= self.num_Columns:
+            return False
+        shift = new_x + min_x
+        for y, bits in row_Masks:
+            y += new_y
+            if y < 0 or y >= self.num_Rows:
+                return False
+            if self.rows[y] & (bits << shift):
+                return False
         return True
 
     # This function is essential when implementing wall kicks in game. Allows rotation on the barriers
@@ -152,25 +588,190 @@ class Board:
         # This For loop checks whether it needs to move 1 or 2 spaces left or right in the grid
         for dx in [-1, 1, -2, 2]:
             original_x = tetrimino.x    # Store the original position in case the kick is not valid
-            tetrimino.x += dx * self.grid_Size
+            tetrimino.x += dx
             if self.is_Valid_Move(tetrimino, 0, 0):
                 return True
             tetrimino.x = original_x
         return False
 
+    # Every distinct final placement of a tetrimino kind that can be reached from the spawn position by moving left
+    # or right, soft dropping, and rotating either way with the kicks of adjust_For_Rotation. Tucks under overhangs
+    # and spins are found as well as straight drops. Returns (rotation, x, y) in the distinct rotation with the
+    # placement's cells, sorted by rotation, x and y
+    def get_Reachable_Placements(self, kind):
+        tops = [self.num_Rows - height for height in self.heights]
+        if min(tops) < 4:
+            # The stack reaches the spawn rows, so every state is searched from the spawn position
+            return self.search_Placements(kind, None)
+        return self.search_Placements(kind, tops)
+
+    # Breadth first search over (x, y, rotation) states for get_Reachable_Placements
+    # With the column tops given, the rows the piece turns in are empty, so every state at or above a straight
+    # drop's landing row is reachable without visiting it. The search starts from the states just below those that
+    # one of them moves into, which is where tucks and spins start, and only when the rows under the surface have
+    # an empty cell to tuck into. Without the tops, the search starts at the spawn position
+    def search_Placements(self, kind, tops):
+        rows = self.rows
+        num_Columns = self.num_Columns
+        num_Rows = self.num_Rows
+        rotations = SHAPE_ROTATIONS[kind]
+        canonical = CANONICAL_ROTATIONS[kind]
+
+        def fits(x, y, rotation):
+            min_x, max_x, row_Masks = rotations[rotation].masks
+            if x + min_x < 0 or x + max_x >= num_Columns:
+                return False
+            shift = x + min_x
+            for dy, bits in row_Masks:
+                row = y + dy
+                if row < 0 or row >= num_Rows or rows[row] & (bits << shift):
+                    return False
+            return True
+
+        # landing[rotation][x + 5] is the landing row of the straight drop at (x, rotation) from the column tops,
+        # and outside where the rotation is outside the grid, so every x a state moves or kicks to is in the list
+        # Without the tops every state is searched, so each landing row is set above the grid
+        # A rotation with the cells of an earlier distinct one lands where it does, moved by its (dx, dy)
+        # The straight drops of the distinct rotations are already placements, in sorted order
+        outside = -num_Rows
+        length = num_Columns + 12
+        landing = []
+        straight_Drops = []
+        for index, rotation in enumerate(rotations):
+            same, dx, dy = canonical[index]
+            if tops is not None and same != index:
+                moved = landing[same][dx:] + [outside] * dx if dx >= 0 else [outside] * -dx + landing[same][:dx]
+                landing.append([landing_Row - dy for landing_Row in moved] if dy else moved)
+                continue
+            positions = num_Columns - rotation.width + 1
+            landing_Rows = [-1] * positions
+            if tops is not None:
+                landing_Rows = [num_Rows] * positions
+                for i, bottom in enumerate(rotation.bottoms):
+                    landing_Rows = list(map(min, landing_Rows, [top - 1 - bottom for top in tops[i:i + positions]]))
+                straight_Drops.extend(zip([index] * positions, range(-rotation.min_x, positions - rotation.min_x), landing_Rows))
+            padding = 5 - rotation.min_x
+            landing.append([outside] * padding + landing_Rows + [outside] * (length - padding - positions))
+
+        # True when the turn from rotation to turned at (x, y) ends up kicked by dx, the first kick that fits
+        # A kick at or above its landing row fits without reading the rows
+        def is_Kicked(x, y, turned, dx):
+            for kick in ROTATION_KICKS:
+                if kick == dx:
+                    return True
+                if y <= landing[turned][x + kick + 5] or fits(x + kick, y, turned):
+                    return False
+
+        # States one move left, right or turn away that are below the straight drops
+        def get_Moves(x, y, rotation):
+            for new_x in (x - 1, x + 1):
+                if y > landing[rotation][new_x + 5] and fits(new_x, y, rotation):
+                    yield new_x, y, rotation
+            for turn in (1, -1):
+                turned = (rotation + turn) % 4
+                for dx in ROTATION_KICKS:
+                    if y <= landing[turned][x + dx + 5]:
+                        break
+                    if fits(x + dx, y, turned):
+                        yield x + dx, y, turned
+                        break
+
+        seen = set()
+        queue = []
+        finals = []
+        if tops is None:
+            spawn = (num_Columns // 2, 0, 0)
+            if fits(*spawn):
+                seen.add(spawn)
+                queue.append(spawn)
+        else:
+            # A state below its landing row has a cell in an empty cell under the top of one of its columns. The
+            # first one moved into from a straight drop is at most 3 rows under the lowest column top, so only
+            # states over the columns with such cells are tried, on the rows a straight drop next to them reaches
+            holed = covered = 0
+            for y in range(min(tops), min(max(tops) + 3, num_Rows)):
+                holed |= covered & ~rows[y]
+                covered |= rows[y]
+            if not holed:
+                return straight_Drops
+
+            targets = []
+            for index, rotation in enumerate(rotations):
+                # Bit x + min_x is set when the rotation at x covers one of the columns
+                covering = 0
+                for i in range(rotation.width):
+                    covering |= holed >> i
+                covering &= (1 << num_Columns - rotation.width + 1) - 1
+                while covering:
+                    low_Bit = covering & -covering
+                    targets.append((low_Bit.bit_length() - 1 - rotation.min_x, index))
+                    covering ^= low_Bit
+
+            for x, rotation in targets:
+                # A state under the landing row is only moved into from the side, or turned into with a kick of
+                # at most 2 columns, from a straight drop resting lower than it
+                landing_Row = landing[rotation][x + 5]
+                highest = max(landing[rotation][x + 4], landing[rotation][x + 6],
+                              max(landing[(rotation + 1) % 4][x + 3:x + 8]),
+                              max(landing[(rotation - 1) % 4][x + 3:x + 8]))
+                for y in range(landing_Row + 1, highest + 1):
+                    if not fits(x, y, rotation):
+                        continue
+                    sources = [((x - 1, rotation), None), ((x + 1, rotation), None)]
+                    for turn in (1, -1):
+                        sources.extend(((x - dx, (rotation - turn) % 4), dx) for dx in ROTATION_KICKS)
+                    for (source_x, source_Rotation), dx in sources:
+                        if y <= landing[source_Rotation][source_x + 5] and (dx is None or is_Kicked(source_x, y, rotation, dx)):
+                            seen.add((x, y, rotation))
+                            queue.append((x, y, rotation))
+                            break
+
+        # The queue grows while it is walked
+        for x, y, rotation in queue:
+            if fits(x, y + 1, rotation):
+                moves = chain(get_Moves(x, y, rotation), ((x, y + 1, rotation),))
+            else:
+                finals.append((x, y, rotation))
+                moves = get_Moves(x, y, rotation)
+            for state in moves:
+                if state not in seen:
+                    seen.add(state)
+                    queue.append(state)
+
+        # Only the tucks and spins are left to add to the straight drops
+        if not finals:
+            return straight_Drops
+        placements = set(straight_Drops)
+        for x, y, rotation in finals:
+            index, dx, dy = canonical[rotation]
+            placements.add((index, x + dx, y + dy))
+        return sorted(placements)
+
     def clear_Lines(self):
         lines_Cleared = 0
-        
-        new_Grid = []
-        for row in self.grid:
-            if all(cell != 0 for cell in row):
-                lines_Cleared += 1  # Increment for each full line
-            else:
-                new_Grid.append(row)
-        
-        empty_Rows = [[0] * (self.screen_Width // self.grid_Size) for _ in range(lines_Cleared)]
-        self.grid = empty_Rows + new_Grid
 
+        # A row is full when its bits match the full row mask, no need to look at each cell
+        if self.full_Row in self.rows:
+            new_Grid = []
+            new_Rows = []
+            for row, bits in zip(self.grid, self.rows):
+                if bits == self.full_Row:
+                    lines_Cleared += 1  # Increment for each full line
+                else:
+                    new_Grid.append(row)
+                    new_Rows.append(bits)
+
+            empty_Rows = [[0] * self.num_Columns for _ in range(lines_Cleared)]
+            self.grid = empty_Rows + new_Grid
+            self.rows = [0] * lines_Cleared + new_Rows
+            self.grid_Version += 1
+            self.recount_Columns()
+            self.rehash()
+
+        self.score_Lines(lines_Cleared)
+        return lines_Cleared
+
+    def score_Lines(self, lines_Cleared):
         # Multiplier for the points depending on how many 
         # lines were cleared, following Official Tetris Guidelines
         if lines_Cleared == 1:
@@ -186,12 +787,9 @@ class Board:
         self.lines_Cleared += lines_Cleared
         self.level = min(self.lines_Cleared // 10 + 1, 29) # Cap the max level at 29
 
-        return lines_Cleared
-
     def drop_Piece(self, tetrimino):
-        # Moves the tetrimino down y axis and until the move is not valid
-        while self.is_Valid_Move(tetrimino, 0, 1):
-            tetrimino.y += self.grid_Size
+        # Moves the tetrimino down y axis to the lowest valid row
+        tetrimino.y = self.get_Landing_Row(tetrimino)
         
         # The tetrimino is then added to the last valid spot in the y axis of the grid
         self.add_Piece(tetrimino)
@@ -199,76 +797,278 @@ class Board:
         # Check if any lines are cleared
         return self.clear_Lines()
 
-    def simulate_Piece(self, tetrimino):
-        # Create a temporary board to simulate the piece placement
-        temp_board = [row[:] for row in self.grid]
-        original_x, original_y = tetrimino.x, tetrimino.y
-        
-        while self.is_Valid_Move(tetrimino, 0, 1):
-            tetrimino.y += self.grid_Size
-        
-        self.add_Piece(tetrimino)
-        lines_cleared = self.clear_Lines()
-        
-        tetrimino.x, tetrimino.y = original_x, original_y
-        self.grid = temp_board
-        
-        return lines_cleared
+    # Zobrist hash the board would have with the tetrimino placed where it is, without placing it
+    # The tetrimino's cells have to be empty, as they are for any placement that fits
+    def get_Placed_Hash(self, tetrimino):
+        min_x, max_x, row_Masks = tetrimino.masks
+        board_Hash = self.hash
+        left = tetrimino.x + min_x
+        for y, bits in row_Masks:
+            keys = self.zobrist_Keys[tetrimino.y + y]
+            while bits:
+                low_Bit = bits & -bits
+                board_Hash ^= keys[left + low_Bit.bit_length() - 1]
+                bits ^= low_Bit
+        return board_Hash
+
+    # Places a tetrimino where it is on the bitboard, clears the rows it fills and scores them, all in place
+    # record is filled in with what changed, so undo(record) puts the board back exactly, score, level and lines
+    # included. A piece's rows are next to each other and only they can become full, so only they are saved and
+    # checked, and the rows above the lowest cleared one are moved down in place. Only the column features next
+    # to the piece are saved, every column is only saved when lines clear and the columns are counted again
+    # Returns the lines cleared
+    def apply_Placement(self, tetrimino, record):
+        min_x, max_x, row_Masks = tetrimino.masks
+        rows = self.rows
+        full_Row = self.full_Row
+        top = tetrimino.y + row_Masks[0][0]
+        row_Count = len(row_Masks)
+        if top < 0 or top + row_Count > self.num_Rows:
+            raise IndexError("Trying to add piece out of bounds")
+
+        row_Bits = record.row_Bits
+        for i in range(row_Count):
+            row_Bits[i] = rows[top + i]
+        record.top = top
+        record.row_Count = row_Count
+        start = max(tetrimino.x + min_x - 1, 0)
+        end = min(tetrimino.x + max_x + 2, self.num_Columns)
+        record.start = start
+        record.end = end
+        record.heights[start:end] = self.heights[start:end]
+        record.column_Holes[start:end] = self.column_Holes[start:end]
+        record.holes = self.holes
+        record.bumpiness = self.bumpiness
+        record.hash = self.hash
+        self.place_Bits(tetrimino)
+        record.placed_Holes = self.holes
 
+        lines_Cleared = 0
+        for y in range(top, top + row_Count):
+            if rows[y] == full_Row:
+                record.cleared_Rows[lines_Cleared] = y
+                lines_Cleared += 1
+        record.lines_Cleared = lines_Cleared
+        if lines_Cleared:
+            # Kept rows move down over the cleared ones from the bottom up, and the rows left at the top are emptied
+            bottom = record.cleared_Rows[lines_Cleared - 1]
+            for y in range(bottom - 1, -1, -1):
+                bits = rows[y]
+                if bits != full_Row:
+                    rows[bottom] = bits
+                    bottom -= 1
+            for y in range(bottom + 1):
+                rows[y] = 0
+
+            # The piece did not change the other columns, so they are saved as they are now
+            record.heights[:start] = self.heights[:start]
+            record.heights[end:] = self.heights[end:]
+            record.column_Holes[:start] = self.column_Holes[:start]
+            record.column_Holes[end:] = self.column_Holes[end:]
+            record.start = 0
+            record.end = self.num_Columns
+            self.recount_Columns()
+            self.rehash()
+
+            score = self.score
+            level = self.level
+            self.score_Lines(lines_Cleared)
+            record.score_Delta = self.score - score
+            record.level_Delta = self.level - level
+        return lines_Cleared
+
+    # Drops a tetrimino straight down with apply_Placement, the tetrimino is put back where it was
+    def drop_Placement(self, tetrimino, record):
+        original_y = tetrimino.y
+        tetrimino.y = self.get_Landing_Row(tetrimino)
+        try:
+            return self.apply_Placement(tetrimino, record)
+        finally:
+            tetrimino.y = original_y
+
+    # Takes back the placement record was filled in by, the last one applied to this board
+    def undo(self, record):
+        rows = self.rows
+        lines_Cleared = record.lines_Cleared
+        if lines_Cleared:
+            self.score -= record.score_Delta
+            self.level -= record.level_Delta
+            self.lines_Cleared -= lines_Cleared
+
+            # Rows move back up from the top down, each one as many rows as there are cleared rows below it
+            cleared_Rows = record.cleared_Rows
+            cleared = 0
+            for y in range(cleared_Rows[lines_Cleared - 1] + 1):
+                if cleared < lines_Cleared and y == cleared_Rows[cleared]:
+                    cleared += 1
+                else:
+                    rows[y] = rows[y + lines_Cleared - cleared]
+
+        top = record.top
+        row_Bits = record.row_Bits
+        for i in range(record.row_Count):
+            rows[top + i] = row_Bits[i]
+        start = record.start
+        end = record.end
+        self.heights[start:end] = record.heights[start:end]
+        self.column_Holes[start:end] = record.column_Holes[start:end]
+        self.holes = record.holes
+        self.bumpiness = record.bumpiness
+        self.hash = record.hash
+
+    # Lines a tetrimino would clear if it was dropped straight down, from the rows it would land on
+    # Nothing is placed, the board is only read
+    def get_Drop_Lines(self, tetrimino):
+        min_x, max_x, row_Masks = tetrimino.masks
+        grid_x = tetrimino.x + min_x
+        grid_y = self.get_Landing_Row(tetrimino)
+        if grid_x < 0 or tetrimino.x + max_x >= self.num_Columns:
+            raise IndexError("Trying to add piece out of bounds")
+        if grid_y + row_Masks[0][0] < 0 or grid_y + row_Masks[-1][0] >= self.num_Rows:
+            raise IndexError("Trying to add piece out of bounds")
+        lines_Cleared = 0
+        for y, bits in row_Masks:
+            if self.rows[grid_y + y] | bits << grid_x == self.full_Row:
+                lines_Cleared += 1
+        return lines_Cleared
+
+    # Returns the lines a tetrimino would clear if it was dropped, the grid, score and level are left untouched
+    def simulate_Piece(self, tetrimino):
+        return self.get_Drop_Lines(tetrimino)
+
+# A batch of board snapshots in one preallocated buffer, every record the same size
+# Indexing returns a memoryview of a record without copying, and the whole buffer can be sent to another
+# process or written to a file as it is
+class SnapshotBatch:
+    def __init__(self, count, num_Columns=BOARD_WIDTH, num_Rows=BOARD_HEIGHT,
+                 with_Random=True, buffer=None):
+        self.record_Size = get_Snapshot_Size(num_Columns, num_Rows, with_Random)
+        self.with_Random = with_Random
+        self.buffer = buffer if buffer is not None else bytearray(count * self.record_Size)
+        if len(self.buffer) != count * self.record_Size:
+            raise ValueError("Buffer size does not match the number of snapshots")
+        self.view = memoryview(self.buffer)
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError("Snapshot index out of range")
+        return self.view[index * self.record_Size:(index + 1) * self.record_Size]
+
+    def store(self, index, board):
+        self[index]     # Bounds check
+        board.write_Bytes(self.view, index * self.record_Size, self.with_Random)
+
+    def load(self, index):
+        return Board.from_bytes(self[index])
+
+# Cost functions the AI can rank placements with, all over the same feature vector
+# (holes created, drop height, bumpiness, lines cleared), so the features of a placement are worked out once
+# whichever cost is used. They also work on NumPy arrays of features, for the batched evaluator
+# Each of these is used to test the efficacy of the heuristics, the first one is the AI's default
+def cost_Holes_Height_Bump_Lines(weights, features):
+    holes_Created, drop_Height, bumpiness, lines_Cleared = features
+    return (holes_Created * weights[0]) + (bumpiness * weights[1]) - (drop_Height * weights[2]) - (lines_Cleared * weights[3])
+
+def cost_Holes(weights, features):
+    return features[0] * weights[0]
+
+def cost_Holes_Height(weights, features):
+    return features[0] * weights[0] - (features[1] * weights[2])
+
+def cost_Holes_Height_Bump(weights, features):
+    holes_Created, drop_Height, bumpiness, lines_Cleared = features
+    return (holes_Created * weights[0]) + (bumpiness * weights[1]) - (drop_Height * weights[2])
+
+COST_FUNCTIONS = {
+    "holes_height_bump_lines": cost_Holes_Height_Bump_Lines,
+    "holes": cost_Holes,
+    "holes_height": cost_Holes_Height,
+    "holes_height_bump": cost_Holes_Height_Bump,
+}
+DEFAULT_COST = "holes_height_bump_lines"
+
+# Bitboard rows as a (rows, columns) bool array, the bytes of each row are unpacked so any width works
+def get_Bit_Planes(rows, num_Columns):
+    row_Bytes = (num_Columns + 7) // 8
+    data = np.frombuffer(b"".join(bits.to_bytes(row_Bytes, "little") for bits in rows), dtype=np.uint8)
+    return np.unpackbits(data.reshape(len(rows), row_Bytes), axis=1, bitorder="little")[:, :num_Columns].astype(bool)
 
 class TetrisAI:
-    def __init__(self, board, weights=None, screen=None):
+    def __init__(self, board, weights=None, screen=None, batched=False, cache=None, search_Depth=None, beam_Width=8, time_Budget=None,
+                 cost=DEFAULT_COST, reachable=False):
         self.board = board
-        self.weights = weights if weights else [3.0, 0.5, 0.3, 8.5] # If there are no weights then use these as the default weights
+        self.weights = weights if weights else DEFAULT_WEIGHTS # If there are no weights then use these as the default weights
         self.screen = screen 
 
-    # This function calculates the total number of holes in the grid
+        # Name of the cost function in COST_FUNCTIONS that ranks the placements
+        if cost not in COST_FUNCTIONS:
+            raise ValueError(f"Unknown cost function {cost}, expected one of {', '.join(COST_FUNCTIONS)}")
+        self.cost = cost
+        self.cost_Function = COST_FUNCTIONS[cost]
+
+        # The batched evaluator scores every placement at once with NumPy and picks the same move as the loop
+        if batched and np is None:
+            raise RuntimeError("NumPy is required for the batched AI")
+        self.batched = batched
+        self.candidate_Tables = {}
+
+        # With reachable on, placements come from Board.get_Reachable_Placements, tucks and spins included, and moves
+        # are (rotation, x, y). The batched evaluator only knows straight drops
+        if reachable and batched:
+            raise ValueError("The batched AI only scores straight drops, it cannot search reachable placements")
+        self.reachable = reachable
+
+        # Optional TranspositionCache, the loop AI looks each candidate board up before working out its features
+        self.cache = cache
+
+        # With a search depth the AI runs a beam search over that many pieces instead of the greedy lookahead
+        # time_Budget is in seconds, None searches the full depth every time
+        self.search_Depth = search_Depth
+        self.beam_Width = beam_Width
+        self.time_Budget = time_Budget
+
+        # Optional SearchStats, set by its attach() method. Each search leaves its counts for the last decision here
+        self.stats = None
+        self.candidates_Evaluated = 0
+        self.lookahead_Simulations = 0
+
+        # Undo record every candidate placement is taken back with, made once for the board's width
+        self.undo_Record = None
+
+    # The AI's undo record, made again only if it is given a board of another width
+    def get_Undo_Record(self):
+        if self.undo_Record is None or len(self.undo_Record.heights) != self.board.num_Columns:
+            self.undo_Record = UndoRecord(self.board.num_Columns)
+        return self.undo_Record
+
+    # This function returns the total number of holes in the grid, kept up to date by the board
     def calculate_Holes(self):
-        holes = 0
-        for x in range(len(self.board.grid[0])):
-            column_Hole = False
-            for y in range(len(self.board.grid)):
-                if self.board.grid[y][x] == 0:
-                    if column_Hole:
-                        holes += 1
-                else:
-                    column_Hole = True
-        return holes
+        return self.board.holes
 
     # This will check the drop height of the tetrimino passed through as a parameter    
     def get_Drop_Height(self, tetrimino):
-        initial_y = tetrimino.y
-        while self.board.is_Valid_Move(tetrimino, 0, 1):
-            tetrimino.y += self.board.grid_Size
-        drop_Height = tetrimino.y
-        tetrimino.y = initial_y
-        return drop_Height
-
-    # This will calculate the variance in height of all the columns
+        return self.board.get_Landing_Row(tetrimino) * DROP_HEIGHT_UNIT
+
+    # This will return the variance in height of all the columns
     def calculate_Bumpiness(self):
-        heights = []
-        for x in range(len(self.board.grid[0])):
-            column_Height = 0
-            for y in range(len(self.board.grid)):
-                if self.board.grid[y][x] != 0:
-                    column_Height = len(self.board.grid) - y
-                    break
-            heights.append(column_Height)
-        bumpiness = sum(abs(heights[i] - heights[i + 1]) for i in range(len(heights) - 1))
-        return bumpiness
+        return self.board.bumpiness
 
-    #Each of these functions are used to test the efficacy of the heuristics
+    #Each of these functions are used to test the efficacy of the heuristics, see COST_FUNCTIONS
     def calculate_Cost(self, holes_created, drop_height, bumpiness, lines_cleared):
-        return (holes_created * self.weights[0]) + (bumpiness * self.weights[1]) - (drop_height * self.weights[2]) - (lines_cleared * self.weights[3])
+        return cost_Holes_Height_Bump_Lines(self.weights, (holes_created, drop_height, bumpiness, lines_cleared))
     
     def calculate_Cost_Holes(self, holes_created):
-        return (holes_created * self.weights[0])
+        return cost_Holes(self.weights, (holes_created, 0, 0, 0))
 
     def calculate_Cost_Holes_Height(self, holes_created, drop_height):
-        return (holes_created * self.weights[0] - (drop_height * self.weights[2]))
+        return cost_Holes_Height(self.weights, (holes_created, drop_height, 0, 0))
     
     def calculate_Cost_Holes_Height_Bump(self, holes_created, drop_height, bumpiness):
-        return (holes_created * self.weights[0]) + (bumpiness * self.weights[1]) - (drop_height * self.weights[2])
+        return cost_Holes_Height_Bump(self.weights, (holes_created, drop_height, bumpiness, 0))
 
     # Calls the funtion to get all the heuristics, will be used later for the UI
     def get_Heuristics(self):
@@ -279,74 +1079,321 @@ class TetrisAI:
         }
         return heuristics
 
+    # Moves the tetrimino through every distinct rotation and column where it fits at the top of the grid,
+    # leaving it on its landing row each time. Yields the move (rotation, x) and the drop height
+    # With reachable on, it is moved through every reachable placement instead and the move is (rotation, x, y)
+    def get_Placements(self, tetrimino):
+        if self.reachable:
+            for rotation, x, y in self.board.get_Reachable_Placements(tetrimino.kind):
+                tetrimino.set_Rotation(rotation)
+                tetrimino.x = x
+                tetrimino.y = y
+                yield (rotation, x, y), y * DROP_HEIGHT_UNIT
+            return
+
+        for rotation in DISTINCT_ROTATIONS[tetrimino.kind]:
+            tetrimino.set_Rotation(rotation.index)
+
+            for column in range(self.board.num_Columns - rotation.width + 1):
+                # Move the Tetrimino to the test position
+                x = column - rotation.min_x
+                tetrimino.x = x
+                tetrimino.y = 0
+
+                # Skip positions where the piece does not fit at the top of the grid
+                if not self.board.is_Valid_Move(tetrimino, 0, 0):
+                    continue
+
+                # The landing row comes straight from the column heights
+                tetrimino.y = self.board.get_Landing_Row(tetrimino)
+                yield (rotation.index, x), tetrimino.y * DROP_HEIGHT_UNIT
+
     # This funtion will calculate the cost 
+    # Only the distinct rotations of the current tetrimino are tried, in every column they fit in
     def get_Best_Move(self):
-        best_Move = None
-        Lowest_Cost = float('inf')
-
-        original_x = self.board.current_Tetrimino.x
-        original_y = self.board.current_Tetrimino.y
-        original_Shape = self.board.current_Tetrimino.shape
-
-        initial_Holes = self.calculate_Holes()  # Calculate the number of holes before placing any tetrimino
-
-        for rotation in range(4):
-            self.board.current_Tetrimino.shape = original_Shape  # Reset to original shape before rotating
-            for _ in range(rotation):
-                self.board.current_Tetrimino.rotate()
-
-                for x in range(-self.board.grid_Size, self.board.screen_Width, self.board.grid_Size):
-                    # Move the Tetrimino to the test position
-                    self.board.current_Tetrimino.x = x
-                    self.board.current_Tetrimino.y = 0
-
-                    if self.board.is_Valid_Move(self.board.current_Tetrimino, 0, 0):
-                        # Drop the piece to the bottom
-                        drop_Height = self.get_Drop_Height(self.board.current_Tetrimino)
-                        self.board.current_Tetrimino.y = drop_Height
-
-                        # Simulate the piece placement
-                        temp_Board = [row[:] for row in self.board.grid]
-                        self.board.add_Piece(self.board.current_Tetrimino)
-                        holes_After = self.calculate_Holes()  # Calculate the number of holes after placing the tetrimino
-
-                        holes_Created = holes_After - initial_Holes  # Calculate the difference in holes
-
-                        # Clear lines and calculate lines cleared
-                        lines_Cleared = self.board.clear_Lines()
-
-                        bumpiness = self.calculate_Bumpiness()  # Calculate the bumpiness
-
-                        # Simulate next piece placement and calculate total cost
-                        next_Piece = self.board.next_Tetrimino
-                        next_Piece_Lines_Cleared = self.board.simulate_Piece(next_Piece)
-                        total_Lines_Cleared = lines_Cleared + next_Piece_Lines_Cleared
-                        
-                        # Calculate the cost using the heuristics you want
-                        cost = self.calculate_Cost(holes_Created, drop_Height, bumpiness, total_Lines_Cleared)
-
-                        #cost = self.calculate_Cost_Holes(holes_created)
+        if self.stats is None:
+            return self.search_Best_Move()
+
+        # Instrumented decision, timed and counted into the stats
+        cache_Hits = self.cache.hits if self.cache is not None else 0
+        self.stats.deciding = True
+        start_Time = time.perf_counter()
+        try:
+            best_Move = self.search_Best_Move()
+        finally:
+            self.stats.deciding = False
+        elapsed = time.perf_counter() - start_Time
+        cache_Hits = (self.cache.hits if self.cache is not None else 0) - cache_Hits
+        self.stats.record_Decision(elapsed, self.candidates_Evaluated, self.lookahead_Simulations - cache_Hits, cache_Hits)
+        return best_Move
 
-                        #cost = self.calculate_Cost_Holes_Height(holes_Created, drop_Height)
+    def search_Best_Move(self):
+        if self.search_Depth:
+            return self.get_Best_Move_Beam()
+        if self.batched:
+            return self.get_Best_Move_Batched()
+        return self.get_Best_Move_Greedy()
 
-                        #cost = self.calculate_Cost_Holes_Height_Bump(holes_Created, drop_Height, bumpiness)
+    # The greedy search, every placement of the current tetrimino with the next one dropped straight down after it
+    def get_Best_Move_Greedy(self):
+        return self.choose_Move(self.get_Candidate_Features())
 
+    # The cheapest move by this AI's cost function, the first one found wins a tie
+    def choose_Move(self, candidates):
+        best_Move = None
+        Lowest_Cost = float('inf')
+        cost_Function = self.cost_Function
+        weights = self.weights
+        for move, features in candidates:
+            cost = cost_Function(weights, features)
+            if cost < Lowest_Cost:
+                Lowest_Cost = cost
+                best_Move = move
+        return best_Move
 
-                        if cost < Lowest_Cost:
-                            Lowest_Cost = cost
-                            best_Move = (rotation, x)
+    # Every placement of the current tetrimino with its feature vector (holes created, drop height, bumpiness,
+    # lines cleared by it and the next tetrimino). The features do not depend on the cost function, so AIs
+    # with different ones can share them for the same board
+    def get_Candidate_Features(self):
+        candidates = []
 
-                        # Reset the board state
-                        self.board.grid = temp_Board
-                        self.board.lines_Cleared -= lines_Cleared  # Reset lines cleared after simulation
+        tetrimino = self.board.current_Tetrimino
+        original_x = tetrimino.x
+        original_y = tetrimino.y
+        original_Rotation = tetrimino.rotation
 
-        # Reset Tetrimino to original position and shape
-        self.board.current_Tetrimino.x = original_x
-        self.board.current_Tetrimino.y = original_y
-        self.board.current_Tetrimino.shape = original_Shape
+        initial_Holes = self.calculate_Holes()  # Calculate the number of holes before placing any tetrimino
+        record = self.get_Undo_Record()
+        next_Piece = self.board.next_Tetrimino
+
+        for move, drop_Height in self.get_Placements(tetrimino):
+            # The cache is keyed by the hash of the board with the piece on it, worked out without placing it,
+            # so a hit skips the placement and its features
+            features = None
+            if self.cache is not None:
+                key = (self.board.get_Placed_Hash(tetrimino), next_Piece.kind, next_Piece.rotation, next_Piece.x, next_Piece.y)
+                features = self.cache.get(key)
+            if features is None:
+                # Simulate the piece placement on the bitboard, then take it back, score and lines cleared included
+                self.board.apply_Placement(tetrimino, record)
+                features = self.get_Board_Features(record)
+                self.board.undo(record)
+                if self.cache is not None:
+                    self.cache.put(key, features)
+            holes_After, lines_Cleared, bumpiness, next_Piece_Lines_Cleared = features
+
+            holes_Created = holes_After - initial_Holes  # Calculate the difference in holes
+            candidates.append((move, (holes_Created, drop_Height, bumpiness, lines_Cleared + next_Piece_Lines_Cleared)))
+
+        # Reset Tetrimino to original position and rotation
+        tetrimino.x = original_x
+        tetrimino.y = original_y
+        tetrimino.set_Rotation(original_Rotation)
+
+        # Every candidate drops the next tetrimino, unless its features came from the cache
+        self.candidates_Evaluated = self.lookahead_Simulations = len(candidates)
+        return candidates
+
+    # Beam search over the current tetrimino and the preview queue, search_Depth pieces deep
+    # Each ply costs its holes created, drop height, bumpiness and lines cleared, and only the beam_Width
+    # cheapest boards are expanded at the next ply. The search is anytime: every finished ply updates the best
+    # first move, and once time_Budget seconds have passed the best move from the last finished ply is returned
+    def get_Best_Move_Beam(self):
+        board = self.board
+        deadline = None if self.time_Budget is None else time.perf_counter() + self.time_Budget
+        current = board.current_Tetrimino
+        pieces = [current] + [Tetrimino(SHAPES[kind]) for kind in board.get_Preview(self.search_Depth - 1)]
+        original_x, original_y, original_Rotation = current.x, current.y, current.rotation
+        root = board.snapshot()
+
+        record = self.get_Undo_Record()
 
+        best_Move = None
+        beam = [(0.0, None, root)]
+        self.candidates_Evaluated = self.lookahead_Simulations = 0
+        for depth, tetrimino in enumerate(pieces):
+            children = []
+            timed_Out = False
+            for cost, first_Move, snapshot in beam:
+                board.restore(snapshot)
+                holes_Before = board.holes
+                for move, drop_Height in self.get_Placements(tetrimino):
+                    lines_Cleared = board.apply_Placement(tetrimino, record)
+                    holes_Created = record.placed_Holes - holes_Before
+                    child_Cost = cost + self.cost_Function(self.weights, (holes_Created, drop_Height, board.bumpiness, lines_Cleared))
+                    children.append((child_Cost, move if first_Move is None else first_Move, board.snapshot()))
+                    board.undo(record)
+
+                # The first ply always finishes so there is a move to return
+                if depth and deadline is not None and time.perf_counter() > deadline:
+                    timed_Out = True
+                    break
+            if depth:
+                self.lookahead_Simulations += len(children)
+            else:
+                self.candidates_Evaluated = len(children)
+            if timed_Out or not children:
+                break
+            children.sort(key=lambda child: child[0])
+            beam = children[:self.beam_Width]
+            best_Move = beam[0][1]
+
+        board.restore(root)
+        current.x, current.y = original_x, original_y
+        current.set_Rotation(original_Rotation)
         return best_Move
 
+    # Works out the features of the board just after a piece has been placed with apply_Placement and record:
+    # the holes, the lines it clears, the bumpiness after clearing them and the lines the next tetrimino would clear
+    # The board is left with the piece on it and its lines cleared, the caller undoes it
+    def get_Board_Features(self, record):
+        holes_After = record.placed_Holes  # The number of holes after placing the tetrimino, before clearing lines
+
+        lines_Cleared = record.lines_Cleared
+
+        bumpiness = self.calculate_Bumpiness()  # Calculate the bumpiness
+
+        # Lines the next piece would clear, read from the rows it lands on without placing it
+        next_Piece_Lines_Cleared = self.board.get_Drop_Lines(self.board.next_Tetrimino)
+
+        return holes_After, lines_Cleared, bumpiness, next_Piece_Lines_Cleared
+
+    # Every (rotation, column) placement of a tetrimino kind, in the same order the loop in get_Best_Move tries them
+    # Returns the moves and, for each one, the row offsets and grid columns of the 4 cells
+    def get_Candidate_Table(self, kind):
+        table = self.candidate_Tables.get(kind)
+        if table is None:
+            moves, cell_Rows, cell_Columns = [], [], []
+            for rotation in DISTINCT_ROTATIONS[kind]:
+                for column in range(self.board.num_Columns - rotation.width + 1):
+                    moves.append((rotation.index, column - rotation.min_x))
+                    cells = [(y, column + x) for x, column_Cells in enumerate(rotation.column_Cells) for y in column_Cells]
+                    cell_Rows.append([y for y, x in cells])
+                    cell_Columns.append([x for y, x in cells])
+            table = self.candidate_Tables[kind] = (moves, np.array(cell_Rows), np.array(cell_Columns))
+        return table
+
+    # Scores every placement of the current tetrimino in one go with NumPy, each candidate board is one layer of a stack
+    # Gives the same move as the loop in get_Best_Move, including which move wins a tie
+    def get_Best_Move_Batched(self):
+        board = self.board
+        tetrimino = board.current_Tetrimino
+        num_Rows = board.num_Rows
+        moves, cell_Rows, cell_Columns = self.get_Candidate_Table(tetrimino.kind)
+
+        grid = get_Bit_Planes(board.rows, board.num_Columns)
+        tops = num_Rows - np.array(board.heights)
+
+        # Placements have to fit at the top of the grid, then land on the highest filled cell under them
+        fits = ~grid[cell_Rows, cell_Columns].any(axis=1)
+        landing = (tops[cell_Columns] - 1 - cell_Rows).min(axis=1)
+        tucked = np.flatnonzero(fits & (landing < 0))
+        if len(tucked):
+            # Rare case near the top where the piece fits but has to drop into a gap, done like the loop does it
+            original_x, original_y, original_Rotation = tetrimino.x, tetrimino.y, tetrimino.rotation
+            for i in tucked:
+                rotation, tetrimino.x = moves[i]
+                tetrimino.y = 0
+                tetrimino.set_Rotation(rotation)
+                landing[i] = board.get_Landing_Row(tetrimino)
+            tetrimino.x, tetrimino.y = original_x, original_y
+            tetrimino.set_Rotation(original_Rotation)
+
+        candidates = np.flatnonzero(fits)
+        self.candidates_Evaluated = self.lookahead_Simulations = len(candidates)
+        if not len(candidates):
+            return None
+        landing = landing[candidates]
+        cell_Rows = landing[:, None] + cell_Rows[candidates]
+        cell_Columns = cell_Columns[candidates]
+        layers = np.arange(len(candidates))[:, None]
+
+        # Place each candidate on its own copy of the grid and count the holes before any lines clear
+        boards = np.repeat(grid[None], len(candidates), axis=0)
+        boards[layers, cell_Rows, cell_Columns] = True
+        holes_Created = (np.maximum.accumulate(boards, axis=1) & ~boards).sum(axis=(1, 2)) - board.holes
+
+        # Full rows are moved to the top of each layer and emptied, the other rows keep their order
+        full_Rows = boards.all(axis=2)
+        lines_Cleared = full_Rows.sum(axis=1)
+        if lines_Cleared.any():
+            boards = np.take_along_axis(boards, np.argsort(~full_Rows, axis=1, kind='stable')[:, :, None], axis=1)
+            boards[np.arange(num_Rows) < lines_Cleared[:, None]] = False
+
+        filled_Columns = boards.any(axis=1)
+        heights = np.where(filled_Columns, num_Rows - boards.argmax(axis=1), 0)
+        bumpiness = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+
+        # Drop the next tetrimino straight down from where it is on every cleared board
+        next_Piece = board.next_Tetrimino
+        next_Cells = [(y, next_Piece.x + next_Piece.rotation_Entry.min_x + x)
+                      for x, column_Cells in enumerate(next_Piece.rotation_Entry.column_Cells) for y in column_Cells]
+        next_Rows = np.array([y for y, x in next_Cells])
+        next_Columns = np.array([x for y, x in next_Cells])
+        next_Landing = (num_Rows - heights[:, next_Columns] - 1 - next_Rows).min(axis=1)
+        next_Row = next_Piece.y
+        next_Lines_Cleared = np.zeros(len(candidates), dtype=int)
+        stacked = next_Landing >= next_Row
+        if stacked.any():
+            next_Boards = boards[stacked]
+            next_Boards[np.arange(len(next_Boards))[:, None], next_Landing[stacked][:, None] + next_Rows, next_Columns] = True
+            next_Lines_Cleared[stacked] = next_Boards.all(axis=2).sum(axis=1)
+        for i in np.flatnonzero(~stacked):
+            # The next tetrimino is under part of the stack, so it is simulated on the bitboard instead
+            next_Lines_Cleared[i] = self.simulate_Candidate(moves[candidates[i]])
+
+        drop_Height = landing * DROP_HEIGHT_UNIT
+        cost = self.cost_Function(self.weights, (holes_Created, drop_Height, bumpiness, lines_Cleared + next_Lines_Cleared))
+        return moves[candidates[np.argmin(cost)]]
+
+    # Places the current tetrimino with the given move on the bitboard and returns the lines the next tetrimino clears
+    def simulate_Candidate(self, move):
+        board = self.board
+        tetrimino = board.current_Tetrimino
+        original = tetrimino.x, tetrimino.y, tetrimino.rotation
+        record = self.get_Undo_Record()
+        tetrimino.set_Rotation(move[0])
+        tetrimino.x, tetrimino.y = move[1], 0
+        board.drop_Placement(tetrimino, record)
+        next_Lines_Cleared = board.get_Drop_Lines(board.next_Tetrimino)
+        board.undo(record)
+        tetrimino.x, tetrimino.y = original[0], original[1]
+        tetrimino.set_Rotation(original[2])
+        return next_Lines_Cleared
+
+# Runs an AI's decisions on a background thread, so the window keeps drawing and handling events while it thinks
+# Each decision is made on a copy of the board, started as soon as a tetrimino comes into play and picked up
+# when the tetrimino is due to be placed
+class AIWorker:
+    def __init__(self, ai):
+        self.ai = ai
+        self.stats = ai.stats
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.key = None
+
+    # Starts deciding the move for the board's current tetrimino, unless that decision is already under way
+    def request(self, board):
+        key = (board.grid_Version, id(board.current_Tetrimino))
+        if key != self.key:
+            self.key = key
+            self.future = self.executor.submit(self.decide, board.copy(), get_Fall_Speed(board.level))
+
+    def decide(self, board, time_Budget):
+        self.ai.board = board
+        self.ai.time_Budget = time_Budget   # A search only gets as long as one fall step at this level
+        if self.stats is not None:
+            self.stats.attach(self.ai)
+        return self.ai.get_Best_Move()
+
+    # Move for the board's current tetrimino, waiting for the worker if it is still deciding
+    def get_Move(self, board):
+        self.request(board)
+        return self.future.result()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
 def draw_Grid(screen):
     # Draws a grid using the grid's dimensions, makes the grid visible with white lines
     for x in range(0, SCREEN_WIDTH, GRID_SIZE):
@@ -354,32 +1401,116 @@ def draw_Grid(screen):
     for y in range(0, SCREEN_HEIGHT, GRID_SIZE):
         pygame.draw.line(screen, WHITE, (0, y), (SCREEN_WIDTH, y))
 
-def draw_UI(screen, board, heuristics):
-    # Sets up the font and renders the text for the score, level, lines cleared and next tetrimino on screen
-    font = pygame.font.SysFont("Times New Roman", 24)
-    score_Text = font.render(f"Score: {board.score}", True, WHITE)
-    level_Text = font.render(f"Level: {board.level}", True, WHITE)
-    lines_Text = font.render(f"Lines Cleared: {board.lines_Cleared}", True, WHITE)
-    next_Piece_Text = font.render("Next:", True, WHITE)
-
-    screen.blit(score_Text, (SCREEN_WIDTH + 20, 20))
-    screen.blit(level_Text, (SCREEN_WIDTH + 20, 60))
-    screen.blit(lines_Text, (SCREEN_WIDTH + 20, 100))
-    screen.blit(next_Piece_Text, (SCREEN_WIDTH + 20, 140))
-
-    # Draw the next tetrimino
-    if board.next_Tetrimino:
-        for y, row in enumerate(board.next_Tetrimino.shape):
-            for x, val in enumerate(row):
-                if val:
-                    pygame.draw.rect(screen, board.next_Tetrimino.colour, (SCREEN_WIDTH + 20 + x * GRID_SIZE, 180 + y * GRID_SIZE, GRID_SIZE, GRID_SIZE))
-    
-    # Render heuristic values
-    heuristic_y_Offset = 240
-    for heuristic, value in heuristics.items():
-        heuristic_Text = font.render(f"{heuristic}: {value}", True, WHITE)
-        screen.blit(heuristic_Text, (SCREEN_WIDTH + 20, heuristic_y_Offset))
-        heuristic_y_Offset += 40
+# Draws the game with as little work as possible per frame
+# The grid lines are drawn once to their own surface, and the locked cells are kept on a second surface that
+# only changes when the board's grid_Version does, one row at a time. Text is rendered again only when its
+# value changes. draw() returns the rectangles of the screen it changed, to pass to pygame.display.update
+class Renderer:
+    def __init__(self, screen):
+        self.screen = screen
+        self.font = pygame.font.SysFont("Times New Roman", 24)
+        self.play_Rect = pygame.Rect(0, 0, SCREEN_WIDTH + 1, SCREEN_HEIGHT)   # Grid lines end one pixel past the grid
+        self.next_Rect = pygame.Rect(SCREEN_WIDTH + 20, 180, 4 * GRID_SIZE, 2 * GRID_SIZE)
+
+        self.grid_Surface = pygame.Surface(self.play_Rect.size)
+        self.grid_Surface.fill(BLACK)
+        draw_Grid(self.grid_Surface)
+        self.cells_Surface = self.grid_Surface.copy()
+        self.reset()
+
+    # Forgets everything on screen, the next draw() draws the whole frame
+    def reset(self):
+        self.cells_Surface.blit(self.grid_Surface, (0, 0))
+        self.board = None
+        self.grid_Version = None
+        self.drawn_Rows = []
+        self.piece_Key = None
+        self.piece_Rect = None
+        self.next_Kind = None
+        self.texts = {}
+        self.full_Redraw = True
+
+    # Brings the locked cells surface up to date with the board, redrawing only the rows that changed
+    def update_Cells(self, board):
+        dirty = []
+        if len(self.drawn_Rows) != len(board.grid):
+            self.drawn_Rows = [[0] * board.num_Columns for _ in board.grid]
+        for y, row in enumerate(board.grid):
+            if row == self.drawn_Rows[y]:
+                continue
+            row_Rect = pygame.Rect(0, y * GRID_SIZE, self.play_Rect.width, GRID_SIZE)
+            self.cells_Surface.blit(self.grid_Surface, row_Rect, row_Rect)
+            for x, value in enumerate(row):
+                if value:
+                    pygame.draw.rect(self.cells_Surface, SHAPE_COLOURS[value - 1], (x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE))
+            self.drawn_Rows[y] = list(row)
+            dirty.append(row_Rect)
+        self.grid_Version = board.grid_Version
+        return dirty
+
+    # Renders a line of UI text at (SCREEN_WIDTH + 20, y) if it is not already showing there
+    def draw_Text(self, text, y):
+        drawn = self.texts.get(y)
+        if drawn is not None and drawn[0] == text:
+            return None
+        surface = self.font.render(text, True, WHITE)
+        rect = surface.get_rect(topleft=(SCREEN_WIDTH + 20, y))
+        if drawn is not None:
+            self.screen.fill(BLACK, drawn[1])
+            rect = rect.union(drawn[1])
+        self.screen.blit(surface, (SCREEN_WIDTH + 20, y))
+        self.texts[y] = (text, surface.get_rect(topleft=(SCREEN_WIDTH + 20, y)))
+        return rect
+
+    def draw(self, board, heuristics):
+        dirty = []
+        if self.full_Redraw or board is not self.board:
+            self.reset()
+            self.board = board
+            self.screen.fill(BLACK)
+            self.full_Redraw = False
+            dirty.append(self.screen.get_rect())
+
+        # Locked cells, then the tetrimino in play over them. Where the cells or the tetrimino changed, the
+        # screen is restored from the cells surface before the tetrimino is drawn again
+        tetrimino = board.current_Tetrimino
+        piece_Key = (id(tetrimino), tetrimino.x, tetrimino.y, tetrimino.rotation)
+        if board.grid_Version != self.grid_Version or piece_Key != self.piece_Key:
+            changed = self.update_Cells(board) if board.grid_Version != self.grid_Version else []
+            if dirty:
+                changed.append(self.play_Rect)
+            if self.piece_Rect is not None:
+                changed.append(self.piece_Rect)
+            for rect in changed:
+                self.screen.blit(self.cells_Surface, rect, rect)
+
+            tetrimino.draw(self.screen, tetrimino.x * GRID_SIZE, tetrimino.y * GRID_SIZE)
+            piece_Rect = pygame.Rect(tetrimino.x * GRID_SIZE, tetrimino.y * GRID_SIZE, len(tetrimino.shape[0]) * GRID_SIZE, len(tetrimino.shape) * GRID_SIZE)
+            self.piece_Rect = piece_Rect.clip(self.play_Rect)
+            self.piece_Key = piece_Key
+            dirty.extend(changed)
+            dirty.append(self.piece_Rect)
+
+        # Score, level, lines cleared and the next tetrimino
+        texts = [(f"Score: {board.score}", 20), (f"Level: {board.level}", 60),
+                 (f"Lines Cleared: {board.lines_Cleared}", 100), ("Next:", 140)]
+        heuristic_y_Offset = 240
+        for heuristic, value in heuristics.items():
+            texts.append((f"{heuristic}: {value}", heuristic_y_Offset))
+            heuristic_y_Offset += 40
+        for text, y in texts:
+            rect = self.draw_Text(text, y)
+            if rect is not None:
+                dirty.append(rect)
+
+        next_Tetrimino = board.next_Tetrimino
+        if next_Tetrimino and next_Tetrimino.kind != self.next_Kind:
+            self.next_Kind = next_Tetrimino.kind
+            self.screen.fill(BLACK, self.next_Rect)
+            next_Tetrimino.draw(self.screen, self.next_Rect.x, self.next_Rect.y)
+            dirty.append(self.next_Rect)
+
+        return dirty
 
 def get_Fall_Speed(level):
     # Each tetris level, an estimate on the speeds per level based on the Official Tetris Guidelines
@@ -416,51 +1547,302 @@ def get_Fall_Speed(level):
     }
     return level_Speeds.get(level, 100) / 1000.0  # Python.time works with seconds
 
-def main(use_Ai, run_Multiple=False, num_Runs=100, results=None):
+# Locks the current tetrimino in at the AI's chosen (rotation, x) and brings in the next one
+# A (rotation, x, y) move from the reachable search is dropped from row y, where it already rests
+# Returns False when the next tetrimino has no room to spawn, which ends the game
+def apply_Move(board, move):
+    rotation, best_x = move[:2]
+    board.current_Tetrimino.set_Rotation(rotation)
+    board.current_Tetrimino.x = best_x
+    if len(move) > 2:
+        board.current_Tetrimino.y = move[2]
+    board.drop_Piece(board.current_Tetrimino)
+    board.current_Tetrimino = board.next_Tetrimino
+    board.next_Tetrimino = board.get_Next_Tetrimino()
+    return board.is_Valid_Move(board.current_Tetrimino, 0, 0)
+
+# Plays a single AI game as fast as possible, no window, clock or heuristics per frame
+# Returns the final score, level, lines cleared and the number of pieces placed
+# Every move is added to the moves list when one is given, so the game can be saved as a replay
+# A TranspositionCache can be passed in to share evaluated boards between games
+# Any search options (search_Depth, beam_Width, time_Budget) are passed on to the AI
+# Decisions are recorded into stats when a SearchStats is passed in
+# The time of every decision in seconds is added to the timings list when one is given
+def play_Headless_Game(weights=None, max_Pieces=None, batched=False, seed=None, moves=None, cache=None, stats=None,
+                       timings=None, **search_Options):
+    board = Board(seed=seed)
+    ai = TetrisAI(board, weights, batched=batched, cache=cache, **search_Options)
+    if stats is not None:
+        stats.attach(ai)
+    pieces = 0
+    while max_Pieces is None or pieces < max_Pieces:
+        if timings is not None:
+            decision_Start = time.perf_counter()
+            best_Move = ai.get_Best_Move()
+            timings.append(time.perf_counter() - decision_Start)
+        else:
+            best_Move = ai.get_Best_Move()
+        if stats is not None:
+            stats.report()
+        if best_Move is None:   # No valid placement left for the current tetrimino
+            break
+        pieces += 1
+        if moves is not None:
+            moves.append(best_Move)
+        if not apply_Move(board, best_Move):
+            break
+    return board.score, board.level, board.lines_Cleared, pieces
+
+# Plays one headless game from its own seed, this is the job each worker in the pool runs
+# The game's search stats are sent back with the result when they were asked for, so they can be merged,
+# and so are its decision times when they are going to a results store
+def play_Seeded_Game(game):
+    seed, weights, batched, instrument, timed, search_Options = game
+    stats = SearchStats() if instrument else None
+    timings = [] if timed else None
+    result = play_Headless_Game(weights, batched=batched, seed=seed, stats=stats, timings=timings, **search_Options)
+    return (seed,) + result + (stats.get_State() if stats else None, timings)
+
+# Name a game's results are stored under: the cost function, and the search options that change its moves
+# The time budget only limits the beam search, the greedy search always finishes
+def get_Variant_Name(cost=DEFAULT_COST, search_Depth=None, beam_Width=8, time_Budget=None, reachable=False, **search_Options):
+    variant = cost
+    if search_Depth is not None:
+        variant += f"+beam{search_Depth}x{beam_Width}"
+        if time_Budget is not None:
+            variant += f"+budget{time_Budget * 1000:g}ms"
+    if reachable:
+        variant += "+reachable"
+    return variant
+
+# Shards the games across a pool of worker processes, game i uses seed + i
+# Results are streamed to the output file in game order as they finish, so the file only depends on the seeds
+# With instrument on, every game's search stats are merged and summarised every stats_Interval seconds,
+# and saved as JSON to stats_Output at the end
+# Every game is also appended to the results store at results_Store when one is given, with its decision times
+def run_Headless_Games(num_Runs=100, weights=None, output=None, batched=False, workers=None, seed=0,
+                       instrument=False, stats_Output=None, stats_Interval=5.0, results_Store=None, **search_Options):
+    workers = workers or os.cpu_count() or 1
+    instrument = instrument or stats_Output is not None
+    games = [(seed + i, weights, batched, instrument, results_Store is not None, search_Options) for i in range(num_Runs)]
+    stats = SearchStats(stats_Interval) if instrument else None
+    variant = get_Variant_Name(**search_Options)
+    results = []
+    start_Time = time.perf_counter()
+
+    file = open(output, 'w') if output else None
+    store = ResultsWriter(results_Store) if results_Store else None
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        finished_Games = pool.imap(play_Seeded_Game, games) if pool else map(play_Seeded_Game, games)
+        for i, (game_Seed, score, level, lines_Cleared, pieces, game_Stats, timings) in enumerate(finished_Games):
+            line = f"Seed: {game_Seed}, Score: {score}, Level: {level}, Lines Cleared: {lines_Cleared}, Pieces: {pieces}"
+            print(f"Game {i + 1}: {line}")
+            if stats is not None:
+                stats.merge(game_Stats)
+                stats.report()
+            if file:
+                file.write(line + "\n")
+                file.flush()
+            if store:
+                store.write(game_Seed, variant, weights or DEFAULT_WEIGHTS, score, level, lines_Cleared, pieces, timings)
+            results.append((score, level, lines_Cleared, pieces))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if file:
+            file.close()
+            print(f"Results saved to {output}")
+        if store:
+            store.close()
+            print(f"Results appended to {results_Store}")
+
+    elapsed = time.perf_counter() - start_Time
+    print(f"Played {num_Runs} games on {workers} workers in {elapsed:.2f}s ({num_Runs / elapsed:.2f} games/s)")
+    if stats is not None:
+        print(stats.get_Summary_Line())
+        if stats_Output:
+            with open(stats_Output, 'w') as file:
+                json.dump(stats.to_Dict(), file, indent=2)
+            print(f"Search stats saved to {stats_Output}")
+    return results
+
+# Plays one seed with an AI for each named cost function, side by side on the same piece sequence
+# The games move in lockstep, so while two of them have the same board they are on the same piece too, and the
+# candidate features are worked out once and shared. Returns each cost's (score, level, lines cleared, pieces)
+# and the number of decisions that reused another game's features
+# With timings on, each cost's results also get its decision times, a decision on shared features counting the
+# time they took to work out, so every cost is timed as if it played alone
+def play_Variant_Games(costs, weights=None, max_Pieces=None, seed=None, timings=False):
+    if seed is None:
+        seed = int.from_bytes(os.urandom(8), "little")
+    boards = {cost: Board(seed=seed) for cost in costs}
+    ais = {cost: TetrisAI(boards[cost], weights, cost=cost) for cost in costs}
+    decision_Times = {cost: [] for cost in costs} if timings else None
+    results = {}
+    shared = 0
+    pieces = 0
+    playing = list(costs)
+    while playing and (max_Pieces is None or pieces < max_Pieces):
+        features = {}
+        for cost in list(playing):
+            board = boards[cost]
+            key = tuple(board.rows)
+            decision_Start = time.perf_counter()
+            found = features.get(key)
+            if found is None:
+                candidates = ais[cost].get_Candidate_Features()
+                features[key] = (candidates, time.perf_counter() - decision_Start)
+                reused_Time = 0.0
+            else:
+                candidates, reused_Time = found
+                shared += 1
+            best_Move = ais[cost].choose_Move(candidates)
+            if timings:
+                decision_Times[cost].append(reused_Time + time.perf_counter() - decision_Start)
+            if best_Move is None or not apply_Move(board, best_Move):
+                results[cost] = (board.score, board.level, board.lines_Cleared, pieces + (best_Move is not None))
+                playing.remove(cost)
+        pieces += 1
+    for cost in playing:
+        results[cost] = (boards[cost].score, boards[cost].level, boards[cost].lines_Cleared, pieces)
+    if timings:
+        results = {cost: result + (decision_Times[cost],) for cost, result in results.items()}
+    return results, shared
+
+def play_Seeded_Variants(game):
+    seed, costs, weights, max_Pieces, timings = game
+    return (seed,) + play_Variant_Games(costs, weights, max_Pieces, seed, timings)
+
+# Plays every seed with each cost function on a pool of worker processes, game i uses seed + i
+# Lines are written in seed order and then cost order, each one a results line with the cost in front
+# Every game is also appended to the results store at results_Store when one is given, under its cost's name
+def run_Variant_Games(costs, num_Runs=100, weights=None, output=None, workers=None, seed=0, max_Pieces=None,
+                      results_Store=None):
+    workers = workers or os.cpu_count() or 1
+    games = [(seed + i, costs, weights, max_Pieces, results_Store is not None) for i in range(num_Runs)]
+    totals = {cost: [0, 0, 0] for cost in costs}
+    decisions = shared_Decisions = 0
+    start_Time = time.perf_counter()
+
+    file = open(output, 'w') if output else None
+    store = ResultsWriter(results_Store) if results_Store else None
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        finished_Games = pool.imap(play_Seeded_Variants, games) if pool else map(play_Seeded_Variants, games)
+        for game_Seed, results, shared in finished_Games:
+            for cost in costs:
+                score, level, lines_Cleared, pieces = results[cost][:4]
+                line = (f"Cost: {cost}, Seed: {game_Seed}, Score: {score}, Level: {level}, "
+                        f"Lines Cleared: {lines_Cleared}, Pieces: {pieces}")
+                print(line)
+                if file:
+                    file.write(line + "\n")
+                if store:
+                    store.write(game_Seed, cost, weights or DEFAULT_WEIGHTS, score, level, lines_Cleared, pieces, results[cost][4])
+                totals[cost][0] += score
+                totals[cost][1] += lines_Cleared
+                totals[cost][2] += pieces
+                decisions += pieces
+            shared_Decisions += shared
+            if file:
+                file.flush()
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if file:
+            file.close()
+            print(f"Results saved to {output}")
+        if store:
+            store.close()
+            print(f"Results appended to {results_Store}")
+
+    elapsed = time.perf_counter() - start_Time
+    for cost, (score, lines_Cleared, pieces) in totals.items():
+        print(f"{cost:24} mean score {score / num_Runs:10.1f}, mean lines {lines_Cleared / num_Runs:7.1f}, "
+              f"mean pieces {pieces / num_Runs:7.1f}")
+    print(f"Played {num_Runs} seeds x {len(costs)} costs on {workers} workers in {elapsed:.2f}s, "
+          f"{shared_Decisions} of {decisions} decisions reused shared features")
+    return totals
+
+# Plays games with the loop AI and checks the batched AI picks the same move for every piece
+# Returns the number of moves that did not match. Game i uses seed + i, so any mismatch can be played again
+def check_Batched_Parity(num_Runs=10, max_Pieces=500, weights=None, seed=0):
+    mismatches = 0
+    for i in range(num_Runs):
+        board = Board(seed=seed + i)
+        ai = TetrisAI(board, weights)
+        batched_Ai = TetrisAI(board, weights, batched=True)
+        for piece in range(max_Pieces):
+            best_Move = ai.get_Best_Move()
+            batched_Move = batched_Ai.get_Best_Move()
+            if best_Move != batched_Move:
+                mismatches += 1
+                print(f"Game {i + 1} (seed {seed + i}), piece {piece + 1}: loop chose {best_Move}, batched chose {batched_Move}")
+            if best_Move is None or not apply_Move(board, best_Move):
+                break
+    print(f"Batched parity: {mismatches} mismatched moves in {num_Runs} games")
+    return mismatches
+
+def main(use_Ai, run_Multiple=False, num_Runs=100, results=None, search_Depth=None, beam_Width=8, weights=None, stats=None,
+         reachable=False):
+    if pygame is None:
+        raise RuntimeError("pygame is required for the windowed game, use the headless mode instead")
+    pygame.init()
+    pygame.font.init()
+
     # Draw the screen and add Tetris as screen header
     screen = pygame.display.set_mode((SCREEN_WIDTH + UI_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Tetris")
 
     # Introduce a clock for the game's framerate, and create a board instance
     clock = pygame.time.Clock()
-    board = Board(SCREEN_WIDTH, SCREEN_HEIGHT, GRID_SIZE)
-    best_Weights = [3.0, 0.5, 0.3, 8.5]
-    ai = TetrisAI(board, best_Weights, screen)
-    fall_Time = 0
-
-    # Game loop
+    renderer = Renderer(screen)
+    board = Board()
+    best_Weights = weights or DEFAULT_WEIGHTS
+    ai = TetrisAI(board, best_Weights, screen)    # Reads the heuristics shown in the UI
+
+    # The AI that decides the moves searches its own copies of the board on the worker thread
+    decision_Ai = TetrisAI(board.copy(), best_Weights, search_Depth=search_Depth, beam_Width=beam_Width, reachable=reachable)
+    if stats is not None:
+        stats.attach(decision_Ai)
+    worker = AIWorker(decision_Ai)
+    accumulator = 0.0
+    fall_Steps = 0
+
+    # Game loop, the simulation advances in fixed steps of SIMULATION_STEP whatever the frame rate
     running = True
     while running:
-        # Make the screen background black and start the clock
-        screen.fill(BLACK)
-        fall_Time += clock.get_rawtime()
-        clock.tick()
+        # The clock sleeps out the rest of the frame instead of spinning, capping the frame rate
+        accumulator += min(clock.tick(FRAME_RATE) / 1000, MAX_FRAME_TIME)
+
+        # The AI starts on the move for the tetrimino in play while it falls
+        if use_Ai:
+            worker.request(board)
 
-        # Adjust the fall speed depending on the game's level
-        fall_Speed = get_Fall_Speed(board.level)
+        while running and accumulator >= SIMULATION_STEP:
+            accumulator -= SIMULATION_STEP
+            fall_Steps += 1
 
-        # Checks if enough time has passed for the tetrimino to move down
-        if fall_Time / 1000 >= fall_Speed:
-            fall_Time = 0
+            # Checks if enough time has passed for the tetrimino to move down at the game's level
+            if fall_Steps < round(get_Fall_Speed(board.level) / SIMULATION_STEP):
+                continue
+            fall_Steps = 0
             if use_Ai:
-                # Use AI to find the best move
-                best_Move = ai.get_Best_Move()
+                # The worker has usually finished by now, otherwise this waits for it
+                best_Move = worker.get_Move(board)
+                if stats is not None:
+                    stats.report()
                 if best_Move:
-                    rotation, best_x = best_Move
-                    for _ in range(rotation):
-                        board.current_Tetrimino.rotate()
-                    board.current_Tetrimino.x = best_x
-                    while board.is_Valid_Move(board.current_Tetrimino, 0, 1):
-                        board.current_Tetrimino.y += GRID_SIZE
-                    board.drop_Piece(board.current_Tetrimino)
-                    board.current_Tetrimino = board.next_Tetrimino
-                    board.next_Tetrimino = board.get_Next_Tetrimino()
-                    if not board.is_Valid_Move(board.current_Tetrimino, 0, 0):
+                    if not apply_Move(board, best_Move):
                         running = False
+                    worker.request(board)
             else:
                 # Manually move the tetrimino down
                 if board.is_Valid_Move(board.current_Tetrimino, 0, 1):
-                    board.current_Tetrimino.y += GRID_SIZE
+                    board.current_Tetrimino.y += 1
                 else:
                     board.drop_Piece(board.current_Tetrimino)
                     board.current_Tetrimino = board.next_Tetrimino
@@ -476,28 +1858,26 @@ def main(use_Ai, run_Multiple=False, num_Runs=100, results=None):
             # Movement keys, checks if the move is valid before carrying it out
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_LEFT and board.is_Valid_Move(board.current_Tetrimino, -1, 0):
-                    board.current_Tetrimino.x -= GRID_SIZE
+                    board.current_Tetrimino.x -= 1
 
                 if event.key == pygame.K_RIGHT and board.is_Valid_Move(board.current_Tetrimino, 1, 0):
-                    board.current_Tetrimino.x += GRID_SIZE
+                    board.current_Tetrimino.x += 1
 
                 if event.key == pygame.K_DOWN and board.is_Valid_Move(board.current_Tetrimino, 0, 1):
-                    board.current_Tetrimino.y += GRID_SIZE
+                    board.current_Tetrimino.y += 1
 
                 # Rotation keys, checks if the rotation is valid and integrates a wall kick if necessary
                 if event.key == pygame.K_UP:
-                    original_Shape = board.current_Tetrimino.shape
                     board.current_Tetrimino.rotate()
                     if not board.is_Valid_Move(board.current_Tetrimino, 0, 0):
                         if not board.adjust_For_Rotation(board.current_Tetrimino):
-                            board.current_Tetrimino.shape = original_Shape
+                            board.current_Tetrimino.rotate_Anti_Clockwise()
 
                 if event.key == pygame.K_z:
-                    original_Shape = board.current_Tetrimino.shape
                     board.current_Tetrimino.rotate_Anti_Clockwise()
                     if not board.is_Valid_Move(board.current_Tetrimino, 0, 0):
                         if not board.adjust_For_Rotation(board.current_Tetrimino):
-                            board.current_Tetrimino.shape = original_Shape
+                            board.current_Tetrimino.rotate()
 
                 # Hard dropping the tetrimino
                 if event.key == pygame.K_SPACE:
@@ -511,55 +1891,92 @@ def main(use_Ai, run_Multiple=False, num_Runs=100, results=None):
                 if event.key == pygame.K_a:
                     use_Ai = not use_Ai
 
-        # Draws the playing grid with the white lines
-        draw_Grid(screen)
+        # Draw the board and the UI with all the scores, levels, lines cleared and next tetrimino
+        # Only the parts of the screen that changed are pushed to the display
+        dirty_Rects = renderer.draw(board, ai.get_Heuristics())
+        if dirty_Rects:
+            pygame.display.update(dirty_Rects)
 
-        # Reads all the data on the grid and draws the correct placed tetriminos
-        for y, row in enumerate(board.grid):
-            for x, value in enumerate(row):
-                if value:
-                    pygame.draw.rect(screen, SHAPE_COLOURS[value - 1], (x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE))
-
-        # This one draws the current Tetrimino in play
-        board.current_Tetrimino.draw(screen, board.current_Tetrimino.x, board.current_Tetrimino.y)
-
-        # Draw the UI with all the scores, levels, lines cleared and next tetrimino
-        heuristics = ai.get_Heuristics()
-        draw_UI(screen, board, heuristics)
-
-        # Update each frame
-        pygame.display.update()
+    worker.close()
 
     # Print final score and level before quitting
     print(f"Game Over! Final Score: {board.score}, Level: {board.level}, Lines Cleared: {board.lines_Cleared}")
+    if stats is not None:
+        print(stats.get_Summary_Line())
 
     # If running multiple times, store the results
     if run_Multiple and results is not None:
-        results.append((board.score, board.level, board.lines_Cleared))
+        results.append((board.seed, board.score, board.level, board.lines_Cleared))
 
 
-def run_Multiple_Games(num_Runs=100):
+# Plays windowed AI games back to back, appending each one to the results store at results_Store when one is given
+def run_Multiple_Games(num_Runs=100, results_Store=None, weights=None):
     results = []
     for i in range(num_Runs):
         print(f"Running game {i + 1}...")
-        main(use_Ai=True, run_Multiple=True, results=results)
+        main(use_Ai=True, run_Multiple=True, results=results, weights=weights)
 
-    # Save the results to a text file
-    #with open('tetris_results_holes_height_Bump.txt', 'w') as file:
-   #     for score, level, lines_Cleared in results:
-    ##        file.write(f"Score: {score}, Level: {level}, Lines Cleared: {lines_Cleared}\n")
-    #print("Results saved to tetris_results.txt")
+    # Save the results to the results store
+    if results_Store:
+        with ResultsWriter(results_Store) as store:
+            for seed, score, level, lines_Cleared in results:
+                store.write(seed, DEFAULT_COST, weights or DEFAULT_WEIGHTS, score, level, lines_Cleared, None)
+        print(f"Results appended to {results_Store}")
 
 if __name__ == "__main__":
-    mode = input("Enter 'a' to use AI, 'm' to play manually, or 'r' to run multiple AI games: ")
-    if mode == 'r':
-        run_Multiple_Games(100)
-    elif mode == 'a':
-        use_Ai = True
-        main(use_Ai)
+    parser = argparse.ArgumentParser(description="Tetris with a greedy AI")
+    parser.add_argument("mode", nargs="?", choices=["ai", "manual", "multiple", "headless", "parity"],
+                        help="ai/manual open a window, multiple runs windowed AI games, headless runs AI games without pygame, "
+                             "parity checks the batched AI against the loop AI")
+    parser.add_argument("--games", type=int, default=100, help="Number of games for the multiple, headless and parity modes")
+    parser.add_argument("--output", help="File to save the headless results to")
+    parser.add_argument("--batched", action="store_true", help="Score placements with the NumPy batched evaluator")
+    parser.add_argument("--workers", type=int, help="Worker processes for the headless mode, defaults to every core")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first headless or parity game, game i uses seed + i")
+    parser.add_argument("--depth", type=int, help="Beam search this many pieces deep (current, next and the rest of the bag)")
+    parser.add_argument("--beam", type=int, default=8, help="Beam width of the search")
+    parser.add_argument("--budget", type=float, help="Milliseconds the headless search may take per move")
+    parser.add_argument("--stats", action="store_true", help="Record per-decision search stats and print a summary every 5 seconds")
+    parser.add_argument("--stats-output", help="Save the search stats to this JSON file")
+    parser.add_argument("--cost", nargs="+", choices=list(COST_FUNCTIONS), default=[DEFAULT_COST],
+                        help="Cost function of the headless AI, several play each seed side by side to compare them")
+    parser.add_argument("--weights", type=float, nargs=4, metavar=("HOLES", "BUMPINESS", "DROP", "LINES"),
+                        help="AI weights, for example the ones found by tetrisTune.py")
+    parser.add_argument("--reachable", action="store_true", help="Search every reachable placement, tucks and spins included")
+    parser.add_argument("--results", help="Results store (CSV) to append every game to, see tetrisResults.py")
+    args = parser.parse_args()
+
+    mode = args.mode
+    if mode is None:
+        mode = {'a': "ai", 'r': "multiple"}.get(input("Enter 'a' to use AI, 'm' to play manually, or 'r' to run multiple AI games: "), "manual")
+
+    if mode == "headless" and len(args.cost) > 1:
+        # Side by side games share the greedy search's candidate features, none of the other searches are played
+        ignored = [flag for flag, given in (("--depth", args.depth is not None), ("--budget", args.budget is not None),
+                                            ("--batched", args.batched), ("--reachable", args.reachable),
+                                            ("--stats", args.stats), ("--stats-output", args.stats_output is not None)) if given]
+        if ignored:
+            parser.error(f"several --cost functions are compared with the greedy search only, {', '.join(ignored)} cannot be used with them")
+        run_Variant_Games(args.cost, args.games, args.weights, args.output, args.workers, args.seed,
+                          results_Store=args.results)
+    elif mode == "headless":
+        time_Budget = args.budget / 1000 if args.budget is not None else None
+        run_Headless_Games(args.games, args.weights, args.output, args.batched, args.workers, args.seed,
+                           args.stats, args.stats_output, results_Store=args.results, search_Depth=args.depth,
+                           beam_Width=args.beam, time_Budget=time_Budget, cost=args.cost[0], reachable=args.reachable)
+    elif mode == "parity":
+        if check_Batched_Parity(args.games, seed=args.seed):
+            raise SystemExit(1)
+    elif mode == "multiple":
+        run_Multiple_Games(args.games, args.results, args.weights)
     else:
-        use_Ai = False
-        main(use_Ai)
-
-# Clean up Pygame resources
-pygame.quit()
+        stats = SearchStats(5.0) if args.stats or args.stats_output else None
+        main(mode == "ai", search_Depth=args.depth, beam_Width=args.beam, weights=args.weights, stats=stats,
+             reachable=args.reachable)
+        if stats is not None and args.stats_output:
+            with open(args.stats_output, 'w') as file:
+                json.dump(stats.to_Dict(), file, indent=2)
+
+    # Clean up Pygame resources
+    if pygame is not None:
+        pygame.quit()
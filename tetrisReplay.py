@@ -0,0 +1,141 @@
+import argparse
+import struct
+import time
+
+from tetrisFinal import (Board, BOARD_WIDTH, BOARD_HEIGHT, SCREEN_WIDTH, SCREEN_HEIGHT, UI_WIDTH, SHAPE_ROTATIONS, TetrisAI,
+                         Renderer, apply_Move, play_Headless_Game, pygame)
+
+# Replay files are a small header followed by one byte per placed tetrimino
+# The header holds the board size and the seed of the board's piece generator, which is all that is needed
+# to get the same pieces again. Each byte is the rotation in the low 2 bits and the leftmost column the
+# tetrimino covers in the other 6, so boards up to 64 columns wide can be replayed
+REPLAY_MAGIC = b"TRPL"
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct("<4sBBBQ")
+MAX_REPLAY_COLUMNS = 64
+
+# Turns an AI move (rotation, x) for a tetrimino into its replay byte
+# Replays only hold straight drops, a tuck from the reachable search has no byte
+def encode_Move(tetrimino, move):
+    if len(move) != 2:
+        raise ValueError("Replays only hold (rotation, x) moves, not placements from the reachable search")
+    rotation, x = move
+    column = x + SHAPE_ROTATIONS[tetrimino.kind][rotation].min_x
+    return column << 2 | rotation
+
+# Turns a replay byte back into the AI move (rotation, x) for a tetrimino
+def decode_Move(tetrimino, code):
+    rotation = code & 3
+    column = code >> 2
+    return rotation, column - SHAPE_ROTATIONS[tetrimino.kind][rotation].min_x
+
+def new_Board(num_Columns, num_Rows, seed):
+    return Board(num_Columns, num_Rows, seed)
+
+# Packs a finished game into replay bytes, the moves are played again on a fresh board to know each tetrimino
+def encode_Replay(seed, moves, num_Columns=BOARD_WIDTH, num_Rows=BOARD_HEIGHT):
+    if num_Columns > MAX_REPLAY_COLUMNS:
+        raise ValueError(f"Replays hold boards up to {MAX_REPLAY_COLUMNS} columns wide, not {num_Columns}")
+    board = new_Board(num_Columns, num_Rows, seed)
+    data = bytearray(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, num_Columns, num_Rows, seed))
+    for move in moves:
+        data.append(encode_Move(board.current_Tetrimino, move))
+        if not apply_Move(board, move):
+            break
+    return bytes(data)
+
+# Returns (num_Columns, num_Rows, seed, move bytes) from replay bytes
+def decode_Replay(data):
+    magic, version, num_Columns, num_Rows, seed = REPLAY_HEADER.unpack_from(data)
+    if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+        raise ValueError("Not a Tetris replay, or a replay from a different version")
+    return num_Columns, num_Rows, seed, data[REPLAY_HEADER.size:]
+
+def save_Replay(path, data):
+    with open(path, 'wb') as file:
+        file.write(data)
+
+def load_Replay(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+# Plays a game with the AI and returns its replay bytes along with the final score, level, lines cleared and pieces
+def record_Game(seed, weights=None, batched=False, max_Pieces=None):
+    moves = []
+    result = play_Headless_Game(weights, max_Pieces, batched, seed, moves)
+    return encode_Replay(seed, moves), result
+
+# Plays the moves of a replay back at engine speed, no AI is run
+# on_Move is called with the board after each placement, the watch mode uses it to draw the game
+def replay_Game(data, on_Move=None):
+    num_Columns, num_Rows, seed, codes = decode_Replay(data)
+    board = new_Board(num_Columns, num_Rows, seed)
+    for code in codes:
+        running = apply_Move(board, decode_Move(board.current_Tetrimino, code))
+        if on_Move is not None and on_Move(board) is False:
+            break
+        if not running:
+            break
+    return board
+
+# Runs the AI again on the replay's seed and returns the first placement where it would now play differently
+# Returns None when every move still matches, which makes replays useful as regression checks
+def check_Replay(data, weights=None, batched=False):
+    num_Columns, num_Rows, seed, codes = decode_Replay(data)
+    board = new_Board(num_Columns, num_Rows, seed)
+    ai = TetrisAI(board, weights, batched=batched)
+    for piece, code in enumerate(codes):
+        best_Move = ai.get_Best_Move()
+        if best_Move is None or encode_Move(board.current_Tetrimino, best_Move) != code:
+            return piece
+        apply_Move(board, best_Move)
+    return None
+
+# Shows a replay in the pygame window, one placement every step_Time seconds
+def watch_Replay(data, step_Time=0.1):
+    if pygame is None:
+        raise RuntimeError("pygame is required to watch replays")
+    pygame.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH + UI_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Tetris Replay")
+    renderer = Renderer(screen)
+
+    def draw(board):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+        heuristics = {"Holes": board.holes, "Bumpiness": board.bumpiness}
+        pygame.display.update(renderer.draw(board, heuristics))
+        time.sleep(step_Time)
+
+    board = replay_Game(data, draw)
+    pygame.quit()
+    return board
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record, replay and check Tetris AI games")
+    parser.add_argument("command", choices=["record", "play", "watch", "check"],
+                        help="record an AI game, play a replay at engine speed, watch it in a window, "
+                             "or check the current AI still makes the same moves")
+    parser.add_argument("replay", help="Replay file to write or read")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the game to record")
+    parser.add_argument("--step", type=float, default=0.1, help="Seconds between placements when watching")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        data, (score, level, lines_Cleared, pieces) = record_Game(args.seed)
+        save_Replay(args.replay, data)
+        print(f"Recorded {pieces} pieces, Score: {score}, Level: {level}, Lines Cleared: {lines_Cleared}")
+    elif args.command == "check":
+        piece = check_Replay(load_Replay(args.replay))
+        if piece is not None:
+            print(f"The AI plays differently from piece {piece + 1}")
+            raise SystemExit(1)
+        print("The AI still plays every move of the replay")
+    else:
+        data = load_Replay(args.replay)
+        start_Time = time.perf_counter()
+        board = watch_Replay(data, args.step) if args.command == "watch" else replay_Game(data)
+        elapsed = time.perf_counter() - start_Time
+        print(f"Score: {board.score}, Level: {board.level}, Lines Cleared: {board.lines_Cleared} ({elapsed:.3f}s)")
@@ -0,0 +1,257 @@
+import argparse
+import csv
+import os
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Results store for AI games, one CSV row per game appended as games finish
+# The first row is the schema, the column names below, and a store is only ever appended to with the same
+# schema. Loading reads the whole store into one NumPy array per column, so statistics over thousands of games
+# are array operations. Unknown values, like the seed of a game from the old text results, are left empty
+
+RESULTS_COLUMNS = ("seed", "variant", "weights", "score", "level", "lines", "pieces", "decision_ms", "max_decision_ms")
+INTEGER_COLUMNS = ("seed", "score", "level", "lines", "pieces")
+FLOAT_COLUMNS = ("decision_ms", "max_decision_ms")
+METRICS = ("score", "level", "lines", "pieces", "decision_ms", "max_decision_ms")
+
+# Variant of each of the old text results files, from their names. tetris_results.txt was the default cost
+# They were played by an older engine whose search changed the score, so they get their own prefix and are
+# never summarised or compared as games of the current engine
+LEGACY_PREFIX = "legacy/"
+LEGACY_VARIANTS = {
+    "tetris_results": LEGACY_PREFIX + "holes_height_bump_lines",
+    "tetris_results_holes": LEGACY_PREFIX + "holes",
+    "tetris_results_holes_height": LEGACY_PREFIX + "holes_height",
+    "tetris_results_holes_height_bump": LEGACY_PREFIX + "holes_height_bump",
+}
+RESULT_FIELD = re.compile(r"([A-Za-z ]+): ([^,]+)")
+
+PERCENTILES = (5, 25, 75, 95)
+BOOTSTRAP_RESAMPLES = 10000
+BOOTSTRAP_BATCH = 500   # Resamples drawn at once, so a bootstrap of many games does not need all of them in memory
+
+def format_Weights(weights):
+    return "" if weights is None else " ".join(f"{weight:g}" for weight in weights)
+
+# Appends game results to a store, writing the schema first when the store is new
+# Every row is flushed as it is written, so a store is complete up to the last finished game
+class ResultsWriter:
+    def __init__(self, path):
+        self.path = path
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            with open(path, newline='') as file:
+                columns = tuple(next(csv.reader(file)))
+            if columns != RESULTS_COLUMNS:
+                raise ValueError(f"{path} is not a results store, or was written with a different schema")
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if new:
+            self.writer.writerow(RESULTS_COLUMNS)
+
+    # decision_Times is the game's decision times in seconds, left empty when they were not recorded
+    def write(self, seed, variant, weights, score, level, lines, pieces, decision_Times=None):
+        decision_ms = max_decision_ms = ""
+        if decision_Times:
+            decision_ms = f"{sum(decision_Times) / len(decision_Times) * 1000:.4f}"
+            max_decision_ms = f"{max(decision_Times) * 1000:.4f}"
+        self.writer.writerow(("" if seed is None else seed, variant, format_Weights(weights), score, level, lines,
+                              "" if pieces is None else pieces, decision_ms, max_decision_ms))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Loads a store as {column: array}, with -1 for unknown integers and NaN for unknown times
+def load_Results(path):
+    if np is None:
+        raise RuntimeError("NumPy is required to load results stores")
+    with open(path, newline='') as file:
+        reader = csv.reader(file)
+        if tuple(next(reader, ())) != RESULTS_COLUMNS:
+            raise ValueError(f"{path} is not a results store, or was written with a different schema")
+        rows = list(reader)
+    columns = list(zip(*rows)) if rows else [()] * len(RESULTS_COLUMNS)
+    results = {}
+    for name, values in zip(RESULTS_COLUMNS, columns):
+        if name in INTEGER_COLUMNS:
+            results[name] = np.array([int(value) if value else -1 for value in values], dtype=np.int64)
+        elif name in FLOAT_COLUMNS:
+            results[name] = np.array([float(value) if value else np.nan for value in values], dtype=np.float64)
+        else:
+            results[name] = np.array(values, dtype=str)
+    return results
+
+# Reads an old text results file: "Score: x, Level: y, Lines Cleared: z" lines, optionally with the
+# "Seed:", "Pieces:" and "Cost:" fields of the headless and cost comparison modes
+# The variant is the line's cost, or the one the file name stands for, under the legacy prefix
+def read_Legacy_Results(path, variant=None):
+    name = os.path.splitext(os.path.basename(path))[0].lower()
+    default_Variant = LEGACY_PREFIX + variant if variant else LEGACY_VARIANTS.get(name, LEGACY_PREFIX + name)
+    games = []
+    with open(path) as file:
+        for line in file:
+            fields = {key.strip(): value.strip() for key, value in RESULT_FIELD.findall(line)}
+            if "Score" not in fields:
+                continue
+            games.append({
+                "seed": int(fields["Seed"]) if "Seed" in fields else None,
+                "variant": LEGACY_PREFIX + fields["Cost"] if "Cost" in fields else default_Variant,
+                "score": int(fields["Score"]),
+                "level": int(fields["Level"]),
+                "lines": int(fields["Lines Cleared"]),
+                "pieces": int(fields["Pieces"]) if "Pieces" in fields else None,
+            })
+    return games
+
+# Appends the games of old text results files to a store, returns how many were imported
+def import_Legacy_Results(store, paths, variant=None, weights=None):
+    imported = 0
+    with ResultsWriter(store) as writer:
+        for path in paths:
+            games = read_Legacy_Results(path, variant)
+            for game in games:
+                writer.write(game["seed"], game["variant"], weights, game["score"], game["level"], game["lines"], game["pieces"])
+            imported += len(games)
+            print(f"Imported {len(games)} games from {path}")
+    return imported
+
+# Percentile bootstrap confidence interval of the mean, seeded so the same store always gives the same interval
+def bootstrap_Interval(values, confidence=0.95, resamples=BOOTSTRAP_RESAMPLES, seed=0):
+    if len(values) < 2:
+        mean = float(values.mean()) if len(values) else float("nan")
+        return mean, mean
+    generator = np.random.default_rng(seed)
+    means = []
+    for start in range(0, resamples, BOOTSTRAP_BATCH):
+        samples = generator.integers(0, len(values), (min(BOOTSTRAP_BATCH, resamples - start), len(values)))
+        means.append(values[samples].mean(axis=1))
+    means = np.concatenate(means)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(means, [tail, 100 - tail])
+    return float(low), float(high)
+
+# Games that have a value for the metric, old results have no seeds, pieces or decision times
+def get_Known(results, metric):
+    values = results[metric]
+    return ~np.isnan(values) if metric in FLOAT_COLUMNS else values >= 0
+
+def summarize(values, confidence=0.95):
+    if not len(values):
+        return None
+    low, high = bootstrap_Interval(values.astype(np.float64), confidence)
+    summary = {"games": len(values), "mean": float(values.mean()), "median": float(np.median(values)),
+               "ci_low": low, "ci_high": high}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{p}"] = float(value)
+    return summary
+
+# Summary of a metric for every variant in the store, in the order the variants first appear
+def summarize_Variants(results, metric="score", confidence=0.95):
+    variants = dict.fromkeys(results["variant"].tolist())
+    known = get_Known(results, metric)
+    return {variant: summarize(results[metric][known & (results["variant"] == variant)], confidence) for variant in variants}
+
+# Paired comparison of variant b against variant a on the seeds both played, games without a seed are left out
+# A seed played more than once by a variant counts with its mean. Returns the pairs, the mean difference b - a
+# with its bootstrap interval, and the seeds where b was higher, the same and lower
+# Variants with no seeds in common, like the old results, are compared unpaired: the difference of their means,
+# with an interval from resampling each variant's games on their own
+def compare_Variants(results, a, b, metric="score", confidence=0.95):
+    known = get_Known(results, metric)
+    per_Seed = []
+    for variant in (a, b):
+        chosen = known & (results["variant"] == variant) & (results["seed"] >= 0)
+        seeds, inverse = np.unique(results["seed"][chosen], return_inverse=True)
+        totals = np.bincount(inverse, weights=results[metric][chosen].astype(np.float64), minlength=len(seeds))
+        per_Seed.append(dict(zip(seeds.tolist(), (totals / np.bincount(inverse, minlength=len(seeds))).tolist())))
+    seeds = sorted(per_Seed[0].keys() & per_Seed[1].keys())
+    if not seeds:
+        return compare_Unpaired(results, a, b, metric, confidence)
+    differences = np.array([per_Seed[1][seed] - per_Seed[0][seed] for seed in seeds])
+    low, high = bootstrap_Interval(differences, confidence)
+    return {"pairs": len(seeds), "mean_a": float(np.mean([per_Seed[0][seed] for seed in seeds])),
+            "mean_b": float(np.mean([per_Seed[1][seed] for seed in seeds])), "mean_difference": float(differences.mean()),
+            "ci_low": low, "ci_high": high, "b_higher": int((differences > 0).sum()),
+            "ties": int((differences == 0).sum()), "b_lower": int((differences < 0).sum())}
+
+def compare_Unpaired(results, a, b, metric="score", confidence=0.95):
+    known = get_Known(results, metric)
+    games = [results[metric][known & (results["variant"] == variant)].astype(np.float64) for variant in (a, b)]
+    if not len(games[0]) or not len(games[1]):
+        return None
+    generator = np.random.default_rng(0)
+    differences = []
+    for start in range(0, BOOTSTRAP_RESAMPLES, BOOTSTRAP_BATCH):
+        size = min(BOOTSTRAP_BATCH, BOOTSTRAP_RESAMPLES - start)
+        means = [values[generator.integers(0, len(values), (size, len(values)))].mean(axis=1) for values in games]
+        differences.append(means[1] - means[0])
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(np.concatenate(differences), [tail, 100 - tail])
+    return {"pairs": 0, "games_a": len(games[0]), "games_b": len(games[1]), "mean_a": float(games[0].mean()),
+            "mean_b": float(games[1].mean()), "mean_difference": float(games[1].mean() - games[0].mean()),
+            "ci_low": float(low), "ci_high": float(high)}
+
+def print_Summary(results, metric, confidence):
+    print(f"{metric}, {confidence:.0%} bootstrap interval of the mean")
+    print(f"{'variant':32} {'games':>6} {'mean':>12} {'interval':>25} {'median':>12} "
+          + " ".join(f"{f'p{p}':>10}" for p in PERCENTILES))
+    for variant, summary in summarize_Variants(results, metric, confidence).items():
+        if summary is None:
+            print(f"{variant:32} {0:6}")
+            continue
+        interval = f"[{summary['ci_low']:.1f}, {summary['ci_high']:.1f}]"
+        print(f"{variant:32} {summary['games']:6} {summary['mean']:12.1f} {interval:>25} {summary['median']:12.1f} "
+              + " ".join(f"{summary[f'p{p}']:10.1f}" for p in PERCENTILES))
+
+def print_Comparison(results, a, b, metric, confidence):
+    comparison = compare_Variants(results, a, b, metric, confidence)
+    if comparison is None:
+        print(f"No {metric} results to compare for {a} and {b}")
+        return
+    if not comparison["pairs"]:
+        print(f"{b} - {a} on {metric}, unpaired as they have no seeds in common ({comparison['games_b']} and "
+              f"{comparison['games_a']} games): {comparison['mean_difference']:+.1f} ({comparison['mean_b']:.1f} vs "
+              f"{comparison['mean_a']:.1f}), {confidence:.0%} interval [{comparison['ci_low']:+.1f}, {comparison['ci_high']:+.1f}]")
+        return
+    print(f"{b} - {a} on {metric} over {comparison['pairs']} paired seeds: {comparison['mean_difference']:+.1f} "
+          f"({comparison['mean_b']:.1f} vs {comparison['mean_a']:.1f}), {confidence:.0%} interval "
+          f"[{comparison['ci_low']:+.1f}, {comparison['ci_high']:+.1f}]")
+    print(f"{b} higher on {comparison['b_higher']} seeds, the same on {comparison['ties']}, lower on {comparison['b_lower']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Results store of AI games: import old results and compare variants")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_Parser = subparsers.add_parser("import", help="Append old tetris_results*.txt files to a store")
+    import_Parser.add_argument("store", help="Results store (CSV) to append to")
+    import_Parser.add_argument("files", nargs="+", help="Text results files")
+    import_Parser.add_argument("--variant", help="Variant, after legacy/, of lines without a cost, defaults to the one the file name stands for")
+    summary_Parser = subparsers.add_parser("summary", help="Mean, median, percentiles and intervals for every variant")
+    summary_Parser.add_argument("store")
+    compare_Parser = subparsers.add_parser("compare", help="Paired comparison of two variants on the seeds both played, "
+                                                           "unpaired when they have none in common")
+    compare_Parser.add_argument("store")
+    compare_Parser.add_argument("a", help="Baseline variant")
+    compare_Parser.add_argument("b", help="Variant compared against it")
+    for subparser in (summary_Parser, compare_Parser):
+        subparser.add_argument("--metric", choices=METRICS, default="score", help="Column to aggregate")
+        subparser.add_argument("--confidence", type=float, default=0.95, help="Confidence of the bootstrap intervals")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        count = import_Legacy_Results(args.store, args.files, args.variant)
+        print(f"{count} games appended to {args.store}")
+    elif args.command == "summary":
+        print_Summary(load_Results(args.store), args.metric, args.confidence)
+    else:
+        print_Comparison(load_Results(args.store), args.a, args.b, args.metric, args.confidence)
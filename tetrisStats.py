@@ -0,0 +1,163 @@
+import math
+import time
+from collections import Counter
+
+# Instrumentation for the AI's decisions
+# SearchStats is attached to a TetrisAI and records each decision's wall time, candidates evaluated, lookahead
+# simulations and cache hits into histograms. It also times the Board primitives, so a slow decision can be put
+# down to candidate enumeration, feature extraction, lookahead or saving and restoring the board. Nothing is
+# added to the AI or the board until attach() is called, so it costs nothing when it is off
+
+LOG_RATIO = math.log(1.02)  # Latency buckets are 2% wide, so percentiles are within 2% of the real value
+MIN_LATENCY = 1e-9
+
+# Board primitives that are timed and the phase of the decision their time counts towards
+# Only the outermost timed call counts, so a lookahead's own landing, placement and clears are part of the lookahead
+PHASES = {
+    "is_Valid_Move": "enumeration",
+    "get_Landing_Row": "enumeration",
+    "get_Reachable_Placements": "enumeration",
+    "place_Bits": "features",
+    "apply_Placement": "features",
+    "drop_Placement": "lookahead",
+    "get_Drop_Lines": "lookahead",
+    "undo": "restore",
+    "snapshot": "restore",
+    "restore": "restore",
+}
+
+class Histogram:
+    # Exact histograms keep a count for every value and suit small integer counts,
+    # the others keep log spaced buckets and suit latencies
+    def __init__(self, exact=False):
+        self.exact = exact
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        key = value if self.exact else math.floor(math.log(max(value, MIN_LATENCY)) / LOG_RATIO)
+        self.buckets[key] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    # Value below which p percent of the recorded values fall, the top of the bucket for latencies
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        target = p / 100 * self.count
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen >= target:
+                return key if self.exact else min(math.exp((key + 1) * LOG_RATIO), self.max)
+        return self.max
+
+    def get_State(self):
+        return {"exact": self.exact, "buckets": sorted(self.buckets.items()), "count": self.count,
+                "total": self.total, "max": self.max}
+
+    def merge(self, state):
+        self.buckets.update(dict((key, count) for key, count in state["buckets"]))
+        self.count += state["count"]
+        self.total += state["total"]
+        self.max = max(self.max, state["max"])
+
+    def get_Summary(self):
+        return {"count": self.count, "mean": self.total / self.count if self.count else 0,
+                "p50": self.percentile(50), "p99": self.percentile(99), "max": self.max}
+
+class SearchStats:
+    def __init__(self, summary_Interval=None):
+        self.decision_Times = Histogram()
+        self.candidates = Histogram(exact=True)
+        self.lookahead = Histogram(exact=True)
+        self.cache_Hits = Histogram(exact=True)
+        self.phase_Times = Counter()
+        self.phase_Calls = Counter()
+        self.timing_Depth = 0
+        self.deciding = False   # Set by the AI while it decides, the game's own moves and drops are not counted
+
+        # With a summary interval, report() prints a summary line at most once every that many seconds
+        self.summary_Interval = summary_Interval
+        self.last_Summary = time.perf_counter()
+
+    # Turns the instrumentation on for an AI and its board
+    # The timed board primitives are replaced on the board instance only, the Board class is left alone
+    def attach(self, ai):
+        ai.stats = self
+        for name, phase in PHASES.items():
+            setattr(ai.board, name, self.time_Primitive(getattr(ai.board, name), phase))
+
+    def time_Primitive(self, method, phase):
+        def timed(*args):
+            if self.timing_Depth or not self.deciding:
+                return method(*args)
+            self.timing_Depth += 1
+            start_Time = time.perf_counter()
+            try:
+                return method(*args)
+            finally:
+                self.phase_Times[phase] += time.perf_counter() - start_Time
+                self.phase_Calls[phase] += 1
+                self.timing_Depth -= 1
+        return timed
+
+    def record_Decision(self, seconds, candidates, lookahead, cache_Hits):
+        self.decision_Times.record(seconds)
+        self.candidates.record(candidates)
+        self.lookahead.record(lookahead)
+        self.cache_Hits.record(cache_Hits)
+
+    # Raw histograms and phase totals, so stats from worker processes can be merged
+    def get_State(self):
+        return {
+            "decision_times": self.decision_Times.get_State(),
+            "candidates": self.candidates.get_State(),
+            "lookahead": self.lookahead.get_State(),
+            "cache_hits": self.cache_Hits.get_State(),
+            "phase_times": dict(self.phase_Times),
+            "phase_calls": dict(self.phase_Calls),
+        }
+
+    def merge(self, state):
+        self.decision_Times.merge(state["decision_times"])
+        self.candidates.merge(state["candidates"])
+        self.lookahead.merge(state["lookahead"])
+        self.cache_Hits.merge(state["cache_hits"])
+        self.phase_Times.update(state["phase_times"])
+        self.phase_Calls.update(state["phase_calls"])
+
+    # Time spent in each phase, with whatever is not in a timed primitive (costs, sorting, NumPy) as "other"
+    def get_Phases(self):
+        phases = dict(self.phase_Times)
+        phases["other"] = max(self.decision_Times.total - sum(phases.values()), 0.0)
+        return phases
+
+    def to_Dict(self):
+        return {
+            "decision_seconds": self.decision_Times.get_Summary(),
+            "candidates": self.candidates.get_Summary(),
+            "lookahead_simulations": self.lookahead.get_Summary(),
+            "cache_hits": self.cache_Hits.get_Summary(),
+            "phase_seconds": self.get_Phases(),
+            "phase_calls": dict(self.phase_Calls),
+        }
+
+    def get_Summary_Line(self):
+        times = self.decision_Times
+        total_Time = times.total or 1.0
+        phases = " ".join(f"{phase} {seconds / total_Time:.0%}" for phase, seconds in sorted(self.get_Phases().items()))
+        return (f"decisions {times.count} | p50 {times.percentile(50) * 1000:.2f}ms p99 {times.percentile(99) * 1000:.2f}ms "
+                f"max {times.max * 1000:.2f}ms | candidates p50 {self.candidates.percentile(50)} "
+                f"lookahead p50 {self.lookahead.percentile(50)} cache hits p50 {self.cache_Hits.percentile(50)} | {phases}")
+
+    # Prints the summary line if the summary interval has passed since the last one
+    def report(self):
+        now = time.perf_counter()
+        if self.summary_Interval is not None and now - self.last_Summary >= self.summary_Interval:
+            self.last_Summary = now
+            print(self.get_Summary_Line())
@@ -0,0 +1,194 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+
+from tetrisFinal import DEFAULT_WEIGHTS, play_Headless_Game
+
+# Weight tuning for TetrisAI with a simple evolution strategy
+# Each generation samples candidate weights around the current mean, plays them on the same seeds as the incumbent
+# (the best weights found so far) so any difference comes from the weights and not the pieces, and moves the mean
+# towards the best candidates. Seeds are played in rounds, and a candidate that is clearly worse than the incumbent
+# on the seeds played so far is dropped before it plays the rest
+
+# Plays one game for a candidate, this is the job each worker in the pool runs
+# The fitness of a game is the number of lines cleared, capped at max_Pieces pieces so good weights still finish
+def evaluate_Game(job):
+    weights, seed, max_Pieces = job
+    score, level, lines_Cleared, pieces = play_Headless_Game(weights, max_Pieces, seed=seed)
+    return lines_Cleared
+
+def mean(values):
+    return sum(values) / len(values)
+
+# True when a candidate's paired differences against the incumbent are below zero by more than z standard errors
+def is_Clearly_Worse(differences, z=2.0, min_Games=4):
+    if len(differences) < min_Games:
+        return False
+    average = mean(differences)
+    variance = sum((difference - average) ** 2 for difference in differences) / (len(differences) - 1)
+    return average + z * math.sqrt(variance / len(differences)) < 0
+
+class Tuner:
+    def __init__(self, population=12, num_Seeds=16, max_Pieces=300, round_Size=4, sigma=0.3, workers=None,
+                 checkpoint=None, seed=0):
+        self.population = population
+        self.parents = max(1, population // 3)
+        self.max_Pieces = max_Pieces
+        self.round_Size = round_Size
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint = checkpoint
+
+        # Starting point, replaced by the checkpoint when resuming
+        self.random = random.Random(seed)
+        self.seeds = [seed * 1000003 + i for i in range(num_Seeds)]
+        self.generation = 0
+        self.mean = list(DEFAULT_WEIGHTS)
+        self.sigma = [sigma * max(abs(weight), 0.1) for weight in DEFAULT_WEIGHTS]
+        self.incumbent = None
+        self.incumbent_Scores = None
+        self.games_Played = 0
+        self.elapsed = 0.0
+
+        if checkpoint and os.path.exists(checkpoint):
+            self.load_Checkpoint()
+
+    def load_Checkpoint(self):
+        with open(self.checkpoint) as file:
+            state = json.load(file)
+        self.seeds = state["seeds"]
+        self.generation = state["generation"]
+        self.mean = state["mean"]
+        self.sigma = state["sigma"]
+        self.incumbent = state["incumbent"]
+        self.incumbent_Scores = state["incumbent_scores"]
+        self.games_Played = state["games_played"]
+        self.elapsed = state["elapsed"]
+        version, internal_State, gauss = state["random_state"]
+        self.random.setstate((version, tuple(internal_State), gauss))
+        print(f"Resuming from generation {self.generation} of {self.checkpoint}")
+
+    # The checkpoint is written to a temporary file first, so an interrupted write never loses the last one
+    def save_Checkpoint(self):
+        if not self.checkpoint:
+            return
+        state = {
+            "seeds": self.seeds,
+            "generation": self.generation,
+            "mean": self.mean,
+            "sigma": self.sigma,
+            "incumbent": self.incumbent,
+            "incumbent_scores": self.incumbent_Scores,
+            "games_played": self.games_Played,
+            "elapsed": self.elapsed,
+            "random_state": self.random.getstate(),
+        }
+        temporary_Path = self.checkpoint + ".tmp"
+        with open(temporary_Path, 'w') as file:
+            json.dump(state, file, indent=2)
+        os.replace(temporary_Path, self.checkpoint)
+
+    def play(self, pool, jobs):
+        self.games_Played += len(jobs)
+        return pool.map(evaluate_Game, jobs) if pool else list(map(evaluate_Game, jobs))
+
+    # Plays every candidate on the seeds round by round, dropping clearly worse candidates between rounds
+    # Returns each candidate's scores, shorter than the seed list for the ones that were dropped
+    def race(self, pool, candidates):
+        scores = [[] for _ in candidates]
+        alive = list(range(len(candidates)))
+        for start in range(0, len(self.seeds), self.round_Size):
+            round_Seeds = self.seeds[start:start + self.round_Size]
+            jobs = [(candidates[i], seed, self.max_Pieces) for i in alive for seed in round_Seeds]
+            results = self.play(pool, jobs)
+            for n, i in enumerate(alive):
+                scores[i].extend(results[n * len(round_Seeds):(n + 1) * len(round_Seeds)])
+
+            alive = [i for i in alive
+                     if not is_Clearly_Worse([score - self.incumbent_Scores[s] for s, score in enumerate(scores[i])])]
+            if not alive:
+                break
+        return scores
+
+    def sample_Candidate(self):
+        return [abs(self.random.gauss(weight, sigma)) for weight, sigma in zip(self.mean, self.sigma)]
+
+    def run(self, generations):
+        pool = multiprocessing.Pool(self.workers) if self.workers > 1 else None
+        try:
+            if self.incumbent is None:
+                start_Time = time.perf_counter()
+                self.incumbent = list(self.mean)
+                self.incumbent_Scores = self.play(pool, [(self.incumbent, seed, self.max_Pieces) for seed in self.seeds])
+                self.elapsed += time.perf_counter() - start_Time
+                print(f"Starting weights {self.format_Weights(self.incumbent)}: {mean(self.incumbent_Scores):.2f} lines")
+                self.save_Checkpoint()
+
+            while self.generation < generations:
+                start_Time = time.perf_counter()
+                start_Games = self.games_Played
+                self.step(pool)
+                elapsed = time.perf_counter() - start_Time
+                self.elapsed += elapsed
+                self.generation += 1
+                self.save_Checkpoint()
+
+                games = self.games_Played - start_Games
+                print(f"Generation {self.generation}: incumbent {self.format_Weights(self.incumbent)} "
+                      f"{mean(self.incumbent_Scores):.2f} lines, {games} candidate-games in {elapsed:.1f}s "
+                      f"({games / elapsed:.1f} games/s)")
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        print(f"Best weights: {self.format_Weights(self.incumbent)}, {mean(self.incumbent_Scores):.2f} lines over "
+              f"{len(self.seeds)} seeds. {self.games_Played} candidate-games in {self.elapsed:.1f}s "
+              f"({self.games_Played / max(self.elapsed, 1e-9):.1f} games/s)")
+        return self.incumbent
+
+    # One generation: sample, race against the incumbent, and move the mean to the best candidates
+    def step(self, pool):
+        candidates = [self.sample_Candidate() for _ in range(self.population)]
+        scores = self.race(pool, candidates)
+
+        # Candidates that played every seed rank first, dropped ones are ranked by how they did against the incumbent
+        def rank(i):
+            differences = [score - self.incumbent_Scores[s] for s, score in enumerate(scores[i])]
+            return (len(scores[i]) == len(self.seeds), mean(differences) if differences else -math.inf)
+        order = sorted(range(len(candidates)), key=rank, reverse=True)
+
+        best = order[0]
+        if len(scores[best]) == len(self.seeds) and mean(scores[best]) > mean(self.incumbent_Scores):
+            self.incumbent = candidates[best]
+            self.incumbent_Scores = scores[best]
+
+        # Move the mean to the average of the best candidates, and the step size to their spread
+        parents = [candidates[i] for i in order[:self.parents]]
+        self.mean = [mean(values) for values in zip(*parents)]
+        self.sigma = [max(0.8 * sigma + 0.2 * math.sqrt(mean([(value - average) ** 2 for value in values])), 0.01)
+                      for sigma, average, values in zip(self.sigma, self.mean, zip(*parents))]
+
+    @staticmethod
+    def format_Weights(weights):
+        return "[" + ", ".join(f"{weight:.3f}" for weight in weights) + "]"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the TetrisAI weights with an evolution strategy")
+    parser.add_argument("--generations", type=int, default=20, help="Generations to run, counting the ones already in the checkpoint")
+    parser.add_argument("--population", type=int, default=12, help="Candidates per generation")
+    parser.add_argument("--seeds", type=int, default=16, help="Games every candidate plays, the same seeds for all of them")
+    parser.add_argument("--max-pieces", type=int, default=300, help="Pieces per game before it is stopped")
+    parser.add_argument("--round-size", type=int, default=4, help="Seeds played between checks for clearly worse candidates")
+    parser.add_argument("--sigma", type=float, default=0.3, help="Starting step size, relative to each weight")
+    parser.add_argument("--workers", type=int, help="Worker processes, defaults to every core")
+    parser.add_argument("--checkpoint", default="tetris_tuning.json", help="Checkpoint file, an existing one is resumed")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the tuner and of the game seed set")
+    args = parser.parse_args()
+
+    tuner = Tuner(args.population, args.seeds, args.max_pieces, args.round_size, args.sigma, args.workers,
+                  args.checkpoint, args.seed)
+    tuner.run(args.generations)